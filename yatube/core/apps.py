@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        # Первое обращение к ленивому хранилищу создаёт его, и манифест
+        # статики читается при запуске процесса, а не первым запросом,
+        # который рендерит {% static %}.
+        getattr(staticfiles_storage, 'hashed_files', None)
@@ -0,0 +1,238 @@
+import os
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import time
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Время последнего чтения обновляется не чаще раза в секунду, чтобы
+# горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 1.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed);
+'''
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на машине.
+
+    LOCATION — путь к файлу базы. Размер ограничен MAX_ENTRIES записями
+    и OPTIONS['MAX_BYTES'] байтами: при превышении вытесняются записи,
+    которые дольше всех не читали. Проверка лимитов идёт раз в
+    OPTIONS['CULL_EVERY'] записей процесса, поэтому кэш может ненадолго
+    их превысить. incr и add атомарны между процессами.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_bytes = options.get('MAX_BYTES')
+        self.cull_every = options.get('CULL_EVERY', 50)
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # После fork соединение родителя использовать нельзя.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout,
+                isolation_level=None, check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+            local.writes = 0
+        return local.connection
+
+    @contextmanager
+    def write_transaction(self):
+        """Транзакция с блокировкой на запись с самого начала."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _store(self, connection, key, value, timeout, replace):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+        connection.execute(
+            f'{verb} INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, data, self.get_backend_timeout(timeout), time(), len(data)),
+        )
+
+    def _after_write(self):
+        local = self._local
+        local.writes += 1
+        if local.writes % self.cull_every == 0:
+            self.cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self.write_transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time()),
+            )
+            try:
+                self._store(connection, key, value, timeout, replace=False)
+            except sqlite3.IntegrityError:
+                return False
+        self._after_write()
+        return True
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time()
+        rows = self.connection.execute(
+            'SELECT key, value, accessed FROM cache WHERE key IN (%s) '
+            'AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(keys)),
+            (*keys, now),
+        ).fetchall()
+        touched = [
+            (now, key) for key, _, accessed in rows
+            if now - accessed >= ACCESS_RESOLUTION
+        ]
+        if touched:
+            self.connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', touched
+            )
+        return {keys[key]: pickle.loads(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._store(self.connection, key, value, timeout, replace=True)
+        self._after_write()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self.connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        self.connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self.write_transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+        return value
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def cull(self):
+        """Удаляет просроченные записи и вытесняет самые старые по LRU."""
+        with self.write_transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time(),)
+            )
+            entries, size = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+            extra_entries = entries - self._max_entries
+            extra_bytes = size - self.max_bytes if self.max_bytes else 0
+            if extra_entries <= 0 and extra_bytes <= 0:
+                return
+            # Как и у встроенных бэкендов, вытесняем с запасом:
+            # не меньше 1/CULL_FREQUENCY записей.
+            extra_entries = max(
+                extra_entries, entries // self._cull_frequency
+            )
+            evicted = []
+            rows = connection.execute(
+                'SELECT key, size FROM cache ORDER BY accessed'
+            )
+            for key, row_size in rows:
+                if extra_entries <= 0 and extra_bytes <= 0:
+                    break
+                evicted.append((key,))
+                extra_entries -= 1
+                extra_bytes -= row_size
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?', evicted
+            )
+
+    def close(self, **kwargs):
+        # Соединение живёт в потоке и переиспользуется между запросами.
+        pass
+
+
+def caches_in(directory):
+    """Настройка CACHES, в которой кэши не пересекаются с общими.
+
+    Файлы SQLiteCache переносятся в directory, остальные бэкенды
+    заменяются кэшем в памяти процесса. Нужна замерам и тестам,
+    которые не должны ни читать, ни сбрасывать общий кэш.
+    """
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == f'{__name__}.{SQLiteCache.__name__}':
+            location = os.path.join(directory, f'{alias}.sqlite3')
+            caches[alias] = {**config, 'LOCATION': location}
+        else:
+            caches[alias] = {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': os.path.join(directory, alias),
+            }
+    return caches
@@ -0,0 +1,117 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from time import time
+
+
+class DiskLRUCache:
+    """Кэш файлов на локальном диске с ограничением по байтам.
+
+    Файл лежит в directory/<первые два символа ключа>/<ключ>. Чтение
+    обновляет время изменения файла, и при превышении max_bytes
+    удаляются файлы, которые дольше всех не читали, пока кэш не
+    сократится до low_water от лимита. Лимит проверяется раз в
+    cull_every записей процесса, поэтому его можно ненадолго превысить.
+    """
+
+    def __init__(self, directory, max_bytes, cull_every=20, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.cull_every = cull_every
+        self.low_water = low_water
+        self.writes = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Путь к файлу ключа или None."""
+        path = self.path(key)
+        try:
+            os.utime(path, (time(), time()))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def set(self, key, data):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.writes += 1
+        if self.writes % self.cull_every == 0:
+            self.cull()
+        return path
+
+    @contextmanager
+    def lock(self, key):
+        """Блокировка ключа между потоками и процессами.
+
+        flock держится на отдельном дескрипторе, поэтому второй запрос
+        того же ключа ждёт, пока первый не положит файл в кэш. Файлов
+        блокировок 256, чтобы они не копились. Файл выбирается по хешу
+        всего ключа: у ключей с общим началом, например у размеров
+        одной картинки, блокировки не должны совпадать.
+        """
+        os.makedirs(os.path.join(self.directory, 'locks'), exist_ok=True)
+        stripe = hashlib.md5(key.encode()).hexdigest()[:2]
+        lock_path = os.path.join(self.directory, 'locks', stripe)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_or_create(self, key, create):
+        """Путь к файлу ключа; create() вызывается одним запросом."""
+        path = self.get(key)
+        if path is not None:
+            return path, False
+        with self.lock(key):
+            path = self.get(key)
+            if path is not None:
+                return path, False
+            return self.set(key, create()), True
+
+    def entries(self):
+        for directory, subdirectories, filenames in os.walk(self.directory):
+            if directory == self.directory and 'locks' in subdirectories:
+                subdirectories.remove('locks')
+            for filename in filenames:
+                if filename.endswith('.part'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def cull(self):
+        """Удаляет давно не читанные файлы сверх лимита."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * self.low_water
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
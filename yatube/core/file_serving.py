@@ -0,0 +1,267 @@
+import mimetypes
+import os
+import re
+import stat as stat_module
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import (ImproperlyConfigured,
+                                    SuspiciousFileOperation)
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Имя с хешем содержимого: posts/aa/bb/<sha256>.jpg, миниатюры sorl,
+# варианты <sha256>-320w.jpg и static вида app.<md5>.css. Файл под
+# таким именем не меняется, и его можно кэшировать навсегда.
+HASHED_NAME = re.compile(r'(^|[.-])[0-9a-f]{12,}([.-]|$)')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MODES = (None, 'x-accel-redirect', 'x-sendfile')
+# Сжатые заранее копии рядом с файлом в порядке предпочтения.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def is_hashed(path):
+    return HASHED_NAME.search(os.path.basename(path)) is not None
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """Границы (start, end) включительно из заголовка Range.
+
+    Несколько диапазонов и незнакомые единицы не поддерживаются,
+    а диапазон с концом раньше начала по RFC 7233 недействителен:
+    тогда возвращается None и отдаётся весь файл. Если первый байт
+    за концом файла, выбрасывается ValueError.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — последние N байт.
+        if not int(last):
+            raise ValueError('Пустой диапазон')
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError('Диапазон за концом файла')
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def if_range_passes(request, etag, last_modified):
+    """Range учитывается, только если If-Range совпадает с версией."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+class FileRange:
+    """Часть открытого файла для FileResponse.
+
+    Файл уже стоит на начале части, а fileno() отдаёт настоящий
+    дескриптор, поэтому wsgi.file_wrapper сервера (у gunicorn это
+    os.sendfile) передаёт ровно Content-Length байт без копирования
+    через Python. Обычное чтение останавливается на конце части.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def internal_url(path):
+    """Внутренний адрес файла для X-Accel-Redirect."""
+    path = os.path.realpath(path)
+    for root, prefix in settings.FILE_SERVING_LOCATIONS.items():
+        root = os.path.realpath(root)
+        if path.startswith(root + os.sep):
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            return prefix + quote(relative)
+    raise ImproperlyConfigured(
+        f'{path} не лежит ни в одном каталоге FILE_SERVING_LOCATIONS'
+    )
+
+
+def file_response(request, path, stat, content_type, etag):
+    """Ответ с телом файла или с заголовком для прокси."""
+    mode = settings.FILE_SERVING_MODE
+    if mode not in MODES:
+        raise ImproperlyConfigured(f'Неизвестный FILE_SERVING_MODE {mode}')
+    if mode == 'x-accel-redirect':
+        # Range, sendfile и длину nginx берёт на себя.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = internal_url(path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and if_range_passes(
+        request, etag, int(stat.st_mtime)
+    ):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = stat.st_size
+        return response
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(
+        FileRange(file, start, length), content_type=content_type, status=206
+    )
+    response['Content-Length'] = length
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return response
+
+
+def file_stat(path):
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Файл не найден')
+    if not stat_module.S_ISREG(stat.st_mode):
+        raise Http404('Файл не найден')
+    return stat
+
+
+def patch_file_cache_control(response, immutable):
+    if immutable:
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.FILE_SERVING_MAX_AGE
+        )
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if not float(params[2:]):
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def precompressed_file(request, path):
+    """(кодировка, путь) сжатой копии рядом с файлом, если клиент её
+    принимает, иначе (None, path)."""
+    accepted = accepted_encodings(request)
+    for encoding, extension in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + extension):
+            return encoding, path + extension
+    return None, path
+
+
+def serve_file(request, path, content_type=None, etag=None, immutable=None,
+               precompressed=False):
+    """Отдаёт файл с диска без чтения его через Python.
+
+    Ответ несёт ETag и Last-Modified и отвечает 304 на условные
+    запросы. Файлы с хешем в имени (или с immutable=True) кэшируются
+    на год, остальные — на FILE_SERVING_MAX_AGE. Байты передаёт
+    wsgi.file_wrapper сервера или, в режиме FILE_SERVING_MODE,
+    front-прокси по X-Accel-Redirect или X-Sendfile. С precompressed
+    вместо файла отдаётся его копия .br или .gz, если она есть.
+    """
+    if content_type is None:
+        content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+    if immutable is None:
+        immutable = is_hashed(path)
+    encoding = None
+    if precompressed:
+        encoding, path = precompressed_file(request, path)
+    stat = file_stat(path)
+    if etag is None:
+        etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = file_response(request, path, stat, content_type, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    if precompressed:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    patch_file_cache_control(response, immutable)
+    return response
+
+
+@require_safe
+def serve(request, path, root_setting, precompressed=False):
+    """Файл из каталога настройки root_setting.
+
+    Каталог читается из настроек при запросе, а не при импорте urls.
+    """
+    try:
+        full_path = safe_join(getattr(settings, root_setting), path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    return serve_file(request, full_path, precompressed=precompressed)
+
+
+def file_urls(prefix, root_setting, precompressed=False):
+    """Адреса для раздачи каталога; в отличие от static() без DEBUG."""
+    if not prefix or urlsplit(prefix).netloc:
+        return []
+    return [re_path(
+        r'^%s(?P<path>.*)$' % re.escape(prefix.lstrip('/')),
+        serve, kwargs={
+            'root_setting': root_setting, 'precompressed': precompressed,
+        },
+    )]
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import random
+import socket
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+PURGE_EVERY = 60
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(name, *args, delay=0):
+    """Ставит в очередь вызов функции name (путь импорта) с args.
+
+    Аргументы сохраняются в JSON. Строка пишется в текущей
+    транзакции: воркеры увидят задачу только после коммита, а при
+    откате её не будет вовсе. Если такая же задача ещё ждёт в
+    очереди, новая не создаётся: возвращается ждущая, и запускается
+    она не позже, чем запустилась бы новая.
+    """
+    run_at = timezone.now() + timedelta(seconds=delay)
+    job, created = Job.objects.get_or_create(
+        name=name,
+        payload=json.dumps(args),
+        status=Job.PENDING,
+        defaults={'run_at': run_at},
+    )
+    if not created and job.run_at > run_at:
+        Job.objects.filter(pk=job.pk, status=Job.PENDING).update(
+            run_at=run_at
+        )
+        job.run_at = run_at
+    return job
+
+
+def dispatch(name, *args):
+    """Выполняет name(*args) воркером с JOBS_WORKER, иначе сразу.
+
+    Для работы, которую можно отложить, но не обязательно: без
+    воркеров она идёт в текущем запросе и его транзакции.
+    """
+    if settings.JOBS_WORKER:
+        enqueue(name, *args)
+    else:
+        import_string(name)(*args)
+
+
+def retry_delay(attempts):
+    """Пауза перед повтором: удваивается с каждой попыткой."""
+    delay = min(
+        settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_MAX_DELAY,
+    )
+    # Разброс не даёт задачам, упавшим вместе, вместе и повторяться.
+    return delay * random.uniform(0.5, 1)
+
+
+def claimable(now):
+    return (
+        Q(status=Job.PENDING, run_at__lte=now)
+        | Q(status=Job.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач в аренду воркеру.
+
+    Задачу берёт условный UPDATE по id, который проходит только у
+    одного воркера, поэтому блокировки строк не нужны и на SQLite.
+    Задачи упавшего воркера снова доступны, когда истекает аренда
+    JOBS_LEASE, поэтому она должна быть дольше самой долгой задачи.
+    Пустой список значит, что готовых задач нет.
+    """
+    while True:
+        now = timezone.now()
+        candidates = list(
+            Job.objects.filter(claimable(now)).order_by('run_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not candidates:
+            return []
+        claimed = [
+            pk for pk in candidates
+            if Job.objects.filter(claimable(now), pk=pk).update(
+                status=Job.RUNNING,
+                locked_by=worker,
+                locked_until=now + timedelta(seconds=settings.JOBS_LEASE),
+                started=now,
+                attempts=F('attempts') + 1,
+            )
+        ]
+        if claimed:
+            return list(
+                Job.objects.filter(pk__in=claimed, locked_by=worker)
+                .order_by('run_at')
+            )
+        # Всю выборку забрали другие воркеры: пустой результат значил
+        # бы пустую очередь, поэтому берём следующую.
+
+
+def run(job):
+    """Выполняет задачу и записывает итог.
+
+    Изменения в базе, сделанные упавшей задачей, откатываются. Она
+    повторяется с растущей паузой, а после JOBS_MAX_ATTEMPTS попыток
+    остаётся в таблице со статусом failed и текстом ошибки.
+    """
+    try:
+        with transaction.atomic():
+            import_string(job.name)(*json.loads(job.payload))
+    except Exception:
+        logger.exception('Задача %s упала', job.name)
+        now = timezone.now()
+        if job.attempts >= settings.JOBS_MAX_ATTEMPTS:
+            fields = {'status': Job.FAILED, 'finished': now}
+        else:
+            fields = {
+                'status': Job.PENDING,
+                'run_at': now + timedelta(
+                    seconds=retry_delay(job.attempts)
+                ),
+            }
+        fields['error'] = traceback.format_exc()
+        success = False
+    else:
+        fields = {
+            'status': Job.DONE, 'finished': timezone.now(), 'error': '',
+        }
+        success = True
+    finish(job, fields)
+    return success
+
+
+def finish(job, fields):
+    """Записывает итог задачи, если она всё ещё у этого воркера.
+
+    Если аренда истекла и задачу забрал другой воркер, итог за ним.
+    """
+    owned = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    try:
+        with transaction.atomic():
+            owned.update(locked_until=None, **fields)
+    except IntegrityError:
+        # Пока задача выполнялась, такую же поставили в очередь заново:
+        # повтор сделает она, а эта попытка закрывается неудачной.
+        fields.update(status=Job.FAILED, finished=timezone.now())
+        owned.update(locked_until=None, **fields)
+
+
+def purge():
+    """Удаляет выполненные задачи старше JOBS_KEEP_DONE."""
+    border = timezone.now() - timedelta(seconds=settings.JOBS_KEEP_DONE)
+    Job.objects.filter(status=Job.DONE, finished__lt=border).delete()
+
+
+def work(worker=None, burst=False, batch_size=10, poll=1.0):
+    """Цикл воркера. Возвращает число выполненных задач.
+
+    С burst цикл заканчивается, когда готовых задач не осталось,
+    иначе воркер ждёт новые, опрашивая таблицу раз в poll секунд.
+    """
+    worker = worker or worker_name()
+    processed = 0
+    last_purge = monotonic()
+    while True:
+        close_old_connections()
+        jobs = claim(worker, batch_size)
+        for job in jobs:
+            run(job)
+            processed += 1
+        if jobs:
+            continue
+        if burst:
+            return processed
+        if monotonic() - last_purge > PURGE_EVERY:
+            purge()
+            last_purge = monotonic()
+        sleep(poll)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0
+
+
+def get_stats(since):
+    """Сводка по типам задач за последние since.
+
+    Для каждого типа: выполнено и упало за период, ждут в очереди,
+    задач в секунду, ожидание от постановки до запуска и время
+    работы (среднее и 95-й процентиль, в секундах).
+    """
+    now = timezone.now()
+    stats = defaultdict(lambda: {
+        'done': 0, 'failed': 0, 'queued': 0, 'waits': [], 'runs': [],
+    })
+    rows = Job.objects.filter(finished__gte=now - since).values_list(
+        'name', 'status', 'created', 'started', 'finished'
+    )
+    for name, status, created, started, finished in rows:
+        item = stats[name]
+        item['done' if status == Job.DONE else 'failed'] += 1
+        item['waits'].append((started - created).total_seconds())
+        item['runs'].append((finished - started).total_seconds())
+    queued = (
+        Job.objects.filter(status__in=(Job.PENDING, Job.RUNNING))
+        .order_by().values_list('name').annotate(total=Count('pk'))
+    )
+    for name, total in queued:
+        stats[name]['queued'] = total
+    return {
+        name: {
+            'done': item['done'],
+            'failed': item['failed'],
+            'queued': item['queued'],
+            'per_second': item['done'] / since.total_seconds(),
+            'wait_mean': mean(item['waits']),
+            'wait_p95': percentile(item['waits'], 0.95),
+            'run_mean': mean(item['runs']),
+            'run_p95': percentile(item['runs'], 0.95),
+        }
+        for name, item in sorted(stats.items())
+    }
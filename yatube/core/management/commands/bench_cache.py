@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+# LocMem не делится между процессами, проверять его на общем счётчике
+# бессмысленно.
+SHARED_BACKENDS = ('filebased', 'sqlite')
+COUNTER_KEY = 'bench:counter'
+
+
+def make_cache(name, directory, max_entries):
+    location = {
+        'locmem': 'bench',
+        'filebased': os.path.join(directory, 'files'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }[name]
+    return import_string(BACKENDS[name])(location, {
+        'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': max_entries},
+    })
+
+
+def increment(name, directory, max_entries, count):
+    cache = make_cache(name, directory, max_entries)
+    for _ in range(count):
+        try:
+            cache.incr(COUNTER_KEY)
+        except ValueError:
+            if not cache.add(COUNTER_KEY, 1):
+                cache.incr(COUNTER_KEY)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMem, файловый и SQLite-кэш: скорость операций, '
+        'долю попаданий при ограниченном размере и атомарность incr '
+        'из нескольких процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', default=','.join(BACKENDS),
+            help='Бэкенды через запятую',
+        )
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--max-entries', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=10000)
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(
+            f'{"бэкенд":<10} {"set мкс":>8} {"get мкс":>8} '
+            f'{"incr мкс":>9} {"попадания":>10} {"incr из процессов":>18}'
+        )
+        for name in options['backends'].split(','):
+            with tempfile.TemporaryDirectory() as directory:
+                self.bench(name, directory)
+
+    def bench(self, name, directory):
+        options = self.options
+        cache = make_cache(name, directory, options['max_entries'])
+        rng = random.Random(options['seed'])
+        value = b'x' * options['value_size']
+        operations = options['operations']
+        # Ключи выбираются со степенным перекосом, как страницы ленты.
+        keys = [
+            f'bench:{int(options["keys"] * rng.random() ** 3)}'
+            for _ in range(operations)
+        ]
+
+        started = perf_counter()
+        for key in keys:
+            cache.set(key, value)
+        set_us = (perf_counter() - started) / operations * 10 ** 6
+
+        hits = 0
+        started = perf_counter()
+        for key in keys:
+            if cache.get(key) is None:
+                cache.set(key, value)
+            else:
+                hits += 1
+        get_us = (perf_counter() - started) / operations * 10 ** 6
+
+        cache.set(COUNTER_KEY, 0)
+        started = perf_counter()
+        for _ in range(operations):
+            cache.incr(COUNTER_KEY)
+        incr_us = (perf_counter() - started) / operations * 10 ** 6
+
+        shared = '—'
+        if name in SHARED_BACKENDS:
+            shared = self.shared_increments(name, directory)
+        self.stdout.write(
+            f'{name:<10} {set_us:>8.1f} {get_us:>8.1f} {incr_us:>9.1f} '
+            f'{hits / operations:>10.1%} {shared:>18}'
+        )
+
+    def shared_increments(self, name, directory):
+        """Считает, сколько incr из параллельных процессов дошло до кэша."""
+        options = self.options
+        cache = make_cache(name, directory, options['max_entries'])
+        cache.delete(COUNTER_KEY)
+        per_process = options['operations'] // options['processes']
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(
+                name, directory, options['max_entries'], per_process,
+            )) for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        expected = per_process * options['processes']
+        return f'{cache.get(COUNTER_KEY)}/{expected}'
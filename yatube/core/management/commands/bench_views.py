@@ -0,0 +1,386 @@
+import json
+import math
+import tempfile
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count
+from django.test import Client, RequestFactory, override_settings
+from django.urls import get_resolver, reverse
+
+from core.cache import caches_in
+from core.query_budget import QueryCounter
+from posts.models import Group, Post
+from posts.resize import resized_url
+from posts.thumbnails import (CARD_THUMBNAIL, cached_thumbnail,
+                              prefetch_thumbnails)
+from posts.utils import POSTS_ON_ONE_PAGE, encode_cursor
+
+User = get_user_model()
+
+# Фиксированный секрет CSRF: Django принимает его и в cookie, и в заголовке.
+CSRF_TOKEN = 'b' * 32
+# Адрес не из INTERNAL_IPS, чтобы debug toolbar не влиял на замеры.
+REMOTE_ADDR = '10.0.0.1'
+COVERED_NAMESPACES = ('posts', 'users', 'about')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(samples)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все страницы posts, users и about через WSGI-приложение '
+        'на заполненной базе и сохраняет задержки, число запросов и размер '
+        'ответов в JSON. Изменения в базе откатываются, кэш страниц '
+        'живёт во временном каталоге.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--deep-page', type=int, default=0)
+        parser.add_argument('--cold-cache', action='store_true')
+        parser.add_argument('--output', help='Куда записать JSON')
+        parser.add_argument('--baseline', help='JSON прошлого прогона')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 относительно базового прогона',
+        )
+        parser.add_argument('--only', help='Сценарии через запятую')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.factory = RequestFactory()
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            # Откат базы не откатывает кэш: страницы с данными, которых
+            # после отката нет, и сдвинутые поколения тегов остались бы
+            # в общем кэше, поэтому замер идёт на отдельном.
+            with tempfile.TemporaryDirectory() as directory:
+                with override_settings(CACHES=caches_in(directory)):
+                    results = self.run_isolated()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'])
+
+    def run_isolated(self):
+        with transaction.atomic():
+            self.application = WSGIHandler()
+            results = self.run_scenarios()
+            transaction.set_rollback(True)
+        return results
+
+    def run_scenarios(self):
+        scenarios = self.build_scenarios()
+        self.check_coverage(scenarios)
+        only = self.options['only']
+        if only:
+            names = only.split(',')
+            scenarios = [item for item in scenarios if item[0] in names]
+        results = {}
+        for name, method, path, session, data in scenarios:
+            for _ in range(self.options['warmup']):
+                self.call(method, path, session, data)
+            samples = [
+                self.call(method, path, session, data)
+                for _ in range(self.options['requests'])
+            ]
+            results[name] = self.summarize(path, samples)
+        if not only or 'thumbnails' in only.split(','):
+            results.update(self.thumbnail_lookups())
+        return results
+
+    def thumbnail_lookups(self):
+        """Сравнивает поиск миниатюр по одной и пачкой на первой странице.
+
+        Миниатюры ищутся только в кэше, поэтому замер идёт в обход
+        страниц и их кэша.
+        """
+        geometry, options = CARD_THUMBNAIL
+        results = {}
+        for name, (path, posts) in self.feeds.items():
+            page = list(posts.order_by('-created', '-pk')[:POSTS_ON_ONE_PAGE])
+            lookups = {
+                'single': lambda: [
+                    cached_thumbnail(post.image, geometry, **options)
+                    for post in page
+                ],
+                'batched': lambda: prefetch_thumbnails(page),
+            }
+            for mode, lookup in lookups.items():
+                for _ in range(self.options['warmup']):
+                    lookup()
+                samples = []
+                for _ in range(self.options['requests']):
+                    counter = QueryCounter()
+                    started = perf_counter()
+                    with connection.execute_wrapper(counter):
+                        lookup()
+                    samples.append({
+                        'ms': (perf_counter() - started) * 1000,
+                        'queries': counter.count, 'bytes': 0, 'status': 200,
+                    })
+                results[f'thumbnails:{name}:{mode}'] = self.summarize(
+                    path, samples
+                )
+        return results
+
+    def build_scenarios(self):
+        post = (
+            Post.objects.annotate(total=Count('comments'))
+            .order_by('-total').first()
+        )
+        if post is None:
+            raise CommandError('База пуста, сначала запустите manage.py seed')
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        author = User.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        reader = User.objects.annotate(
+            total=Count('follower')
+        ).order_by('-total').first()
+        sessions = {
+            'anon': self.session(None),
+            'reader': self.session(reader),
+            'author': self.session(author),
+        }
+        feeds = {
+            'index': (reverse('posts:index'), Post.objects.all()),
+            'group_list': (
+                reverse('posts:group_list', args=[group.slug]),
+                group.posts.all(),
+            ),
+            'profile': (
+                reverse('posts:profile', args=[author.username]),
+                author.posts.all(),
+            ),
+        }
+        self.feeds = feeds
+        scenarios = []
+        for name, (path, posts) in feeds.items():
+            deep_page = self.deep_page(posts.count())
+            deep_post = posts.order_by('-created', '-pk')[
+                (deep_page - 1) * POSTS_ON_ONE_PAGE
+            ]
+            for kind in ('anon', 'reader'):
+                scenarios += [
+                    (f'{name}:{kind}', 'get', path, sessions[kind], None),
+                    (
+                        f'{name}:{kind}:page-{deep_page}', 'get',
+                        f'{path}?page={deep_page}', sessions[kind], None,
+                    ),
+                    (
+                        f'{name}:{kind}:cursor-{deep_page}', 'get',
+                        f'{path}?cursor={encode_cursor(deep_post)}',
+                        sessions[kind], None,
+                    ),
+                ]
+        follow = reverse('posts:follow_index')
+        follow_deep = self.deep_page(reader.timeline.count())
+        detail = reverse('posts:post_detail', args=[post.pk])
+        scenarios += [
+            ('follow_index:reader', 'get', follow, sessions['reader'], None),
+            (
+                f'follow_index:reader:page-{follow_deep}', 'get',
+                f'{follow}?page={follow_deep}', sessions['reader'], None,
+            ),
+            ('post_detail:anon', 'get', detail, sessions['anon'], None),
+            ('post_detail:reader', 'get', detail, sessions['reader'], None),
+            (
+                'post_create:reader', 'get', reverse('posts:post_create'),
+                sessions['reader'], None,
+            ),
+            (
+                'post_create:reader:write', 'post',
+                reverse('posts:post_create'), sessions['reader'],
+                {'text': 'Пост из бенчмарка', 'group': group.pk},
+            ),
+            (
+                'post_edit:author', 'get',
+                reverse('posts:post_edit', args=[
+                    author.posts.values_list('pk', flat=True).first()
+                ]),
+                sessions['author'], None,
+            ),
+            (
+                'add_comment:reader:write', 'post',
+                reverse('posts:add_comment', args=[post.pk]),
+                sessions['reader'], {'text': 'Комментарий из бенчмарка'},
+            ),
+            (
+                'profile_follow:reader:write', 'get',
+                reverse('posts:profile_follow', args=[author.username]),
+                sessions['reader'], None,
+            ),
+            (
+                'profile_unfollow:reader:write', 'get',
+                reverse('posts:profile_unfollow', args=[author.username]),
+                sessions['reader'], None,
+            ),
+            ('viewer:anon', 'get', reverse('posts:viewer'),
+             sessions['anon'], None),
+            (
+                'viewer:reader', 'get',
+                f"{reverse('posts:viewer')}?author={author.username}",
+                sessions['reader'], None,
+            ),
+            ('signup:anon', 'get', reverse('users:signup'),
+             sessions['anon'], None),
+            ('login:anon', 'get', reverse('users:login'),
+             sessions['anon'], None),
+            ('logout:reader', 'get', reverse('users:logout'),
+             self.session(reader, fresh=True), None),
+            ('author:anon', 'get', reverse('about:author'),
+             sessions['anon'], None),
+            ('tech:anon', 'get', reverse('about:tech'),
+             sessions['anon'], None),
+        ]
+        image = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).first()
+        if image:
+            scenarios.append((
+                'resized_image:anon', 'get', resized_url(image, 640, 'card'),
+                sessions['anon'], None,
+            ))
+        return scenarios
+
+    def deep_page(self, total):
+        pages = max(math.ceil(total / POSTS_ON_ONE_PAGE), 1)
+        return min(self.options['deep_page'] or pages // 2 or 1, pages)
+
+    def check_coverage(self, scenarios):
+        """Предупреждает о страницах, которые не попали в сценарии."""
+        covered = {name.split(':')[0] for name, *_ in scenarios}
+        resolver = get_resolver()
+        for namespace in COVERED_NAMESPACES:
+            patterns = resolver.namespace_dict[namespace][1].url_patterns
+            for pattern in patterns:
+                if pattern.name and pattern.name not in covered:
+                    self.stderr.write(
+                        f'Нет сценария для {namespace}:{pattern.name}'
+                    )
+
+    def session(self, user, fresh=False):
+        """Возвращает функцию, отдающую cookie для запроса.
+
+        Для fresh каждый запрос получает новую сессию: так можно мерить
+        выход из аккаунта.
+        """
+        def cookies():
+            if user is None:
+                return f'csrftoken={CSRF_TOKEN}'
+            client = Client()
+            client.force_login(user)
+            sessionid = client.cookies[settings.SESSION_COOKIE_NAME].value
+            return f'sessionid={sessionid}; csrftoken={CSRF_TOKEN}'
+
+        if fresh:
+            return cookies
+        value = cookies()
+        return lambda: value
+
+    def call(self, method, path, session, data):
+        kwargs = {'data': data} if data else {}
+        environ = getattr(self.factory, method)(path, **kwargs).environ
+        environ.update(
+            HTTP_COOKIE=session(),
+            HTTP_X_CSRFTOKEN=CSRF_TOKEN,
+            REMOTE_ADDR=REMOTE_ADDR,
+        )
+        if self.options['cold_cache']:
+            cache.clear()
+        counter = QueryCounter()
+        statuses = []
+        started = perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.application(
+                environ, lambda status, headers: statuses.append(status)
+            )
+            body = b''.join(response)
+        elapsed = perf_counter() - started
+        response.close()
+        return {
+            'ms': elapsed * 1000,
+            'queries': counter.count,
+            'bytes': len(body),
+            'status': int(statuses[0].split()[0]),
+        }
+
+    def summarize(self, path, samples):
+        timings = [sample['ms'] for sample in samples]
+        summary = {'path': path}
+        for percent in PERCENTILES:
+            summary[f'p{percent}'] = round(percentile(timings, percent), 3)
+        summary.update(
+            queries=max(sample['queries'] for sample in samples),
+            bytes=max(sample['bytes'] for sample in samples),
+            statuses=sorted({sample['status'] for sample in samples}),
+        )
+        return summary
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"сценарий":<40} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"SQL":>4} {"байт":>8} статус'
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<40} {row["p50"]:>8.2f} {row["p95"]:>8.2f} '
+                f'{row["p99"]:>8.2f} {row["queries"]:>4} {row["bytes"]:>8} '
+                f'{",".join(map(str, row["statuses"]))}'
+            )
+        for name in self.feeds:
+            single = results.get(f'thumbnails:{name}:single')
+            batched = results.get(f'thumbnails:{name}:batched')
+            if single and batched:
+                self.stdout.write(
+                    f'Миниатюры {name}: пачкой быстрее на '
+                    f'{single["p50"] - batched["p50"]:.3f} мс на страницу'
+                )
+
+    def compare(self, results, baseline_path):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        tolerance = self.options['tolerance']
+        regressions = []
+        for name, row in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if row['p95'] > before['p95'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {before["p95"]:.2f} → {row["p95"]:.2f} мс'
+                )
+            if row['queries'] > before['queries']:
+                regressions.append(
+                    f'{name}: запросов {before["queries"]} → '
+                    f'{row["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базового прогона:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.page_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает счётчики кэша страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики'
+        )
+
+    def handle(self, *args, **options):
+        for name, value in get_stats().items():
+            self.stdout.write(f'{name}: {value}')
+        if options['reset']:
+            reset_stats()
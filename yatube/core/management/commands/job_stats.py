@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from core.jobs import get_stats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает по типам фоновых задач число выполненных, упавших '
+        'и ждущих, пропускную способность и задержки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=float, default=60,
+            help='За сколько последних минут считать',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats(timedelta(minutes=options['minutes']))
+        self.stdout.write(
+            f'{"задача":<40} {"готово":>7} {"упало":>6} {"ждут":>6} '
+            f'{"в сек":>7} {"ожид. ср/95":>13} {"работа ср/95":>13}'
+        )
+        for name, item in stats.items():
+            self.stdout.write(
+                f'{name:<40} {item["done"]:>7} {item["failed"]:>6} '
+                f'{item["queued"]:>6} {item["per_second"]:>7.2f} '
+                f'{item["wait_mean"]:>6.2f}/{item["wait_p95"]:<6.2f} '
+                f'{item["run_mean"]:>6.2f}/{item["run_p95"]:<6.2f}'
+            )
@@ -0,0 +1,62 @@
+import multiprocessing
+from time import monotonic
+
+from core.jobs import work, worker_name
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_worker(options):
+    try:
+        return work(
+            worker_name(), burst=options['burst'],
+            batch_size=options['batch_size'], poll=options['poll'],
+        )
+    except KeyboardInterrupt:
+        return 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из таблицы core_job в нескольких '
+        'процессах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Число процессов-воркеров',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10,
+            help='Сколько задач воркер забирает за раз',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунд',
+        )
+
+    def handle(self, *args, **options):
+        started = monotonic()
+        if options['processes'] == 1:
+            processed = run_worker(options)
+        else:
+            # Соединение родителя после fork не годится: каждый процесс
+            # открывает своё.
+            connections.close_all()
+            with multiprocessing.Pool(options['processes']) as pool:
+                processed = sum(pool.map(
+                    run_worker, [options] * options['processes']
+                ))
+        elapsed = monotonic() - started
+        self.stdout.write(
+            f'Задач выполнено: {processed} за {elapsed:.1f} с'
+        )
+        call_command(
+            'job_stats', minutes=max(elapsed / 60, 1), stdout=self.stdout
+        )
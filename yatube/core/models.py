@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -9,3 +10,71 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StoredFile(CreatedModel):
+    """Файл в хранилище по содержимому и число ссылок на него."""
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    size = models.PositiveIntegerField('Размер')
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class Job(CreatedModel):
+    """Фоновая задача: вызов функции по пути импорта с аргументами."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField('Функция', max_length=255)
+    payload = models.TextField('Аргументы', default='[]')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    run_at = models.DateTimeField('Выполнить не раньше', default=timezone.now)
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    locked_until = models.DateTimeField(
+        'Аренда до', null=True, blank=True
+    )
+    started = models.DateTimeField('Начало', null=True, blank=True)
+    finished = models.DateTimeField('Конец', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='job_status_run_at_idx'
+            ),
+            models.Index(
+                fields=['finished'],
+                name='job_finished_idx'
+            ),
+        ]
+        constraints = [
+            # Одинаковая задача ждёт в очереди не больше одного раза.
+            models.UniqueConstraint(
+                fields=['name', 'payload'],
+                condition=models.Q(status='pending'),
+                name='job_pending_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
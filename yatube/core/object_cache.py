@@ -0,0 +1,132 @@
+import pickle
+import threading
+from collections import OrderedDict
+from time import monotonic
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_init, post_save
+from django.http import Http404
+
+
+class LocalLRU:
+    """Небольшой LRU-кэш процесса с ограничением времени жизни."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ObjectCache:
+    """Сквозной кэш объектов модели: L1 в процессе, L2 в общем кэше.
+
+    Объекты ищутся по полю field и берутся из queryset, поэтому
+    связанные через select_related объекты кэшируются вместе с ними.
+    Сохранение и удаление объекта сбрасывают оба уровня по старому и
+    новому значению поля. L1 других процессов о сбросе не узнаёт и
+    держит копию не дольше OBJECT_CACHE_L1_TIMEOUT секунд.
+    """
+
+    def __init__(self, name, queryset, field='pk'):
+        self.name = name
+        self.queryset = queryset
+        self.field = field
+        self.model = None
+        self.attname = None
+        self.local = LocalLRU(
+            settings.OBJECT_CACHE_L1_SIZE, settings.OBJECT_CACHE_L1_TIMEOUT
+        )
+
+    def key(self, value):
+        return f'object:{self.name}:{quote(str(value))}'
+
+    def get(self, value):
+        """Возвращает объект или бросает model.DoesNotExist."""
+        key = self.key(value)
+        # В L1 лежат байты, чтобы запросы не делили один объект.
+        data = self.local.get(key)
+        if data is None:
+            data = cache.get(key)
+            if data is None:
+                instance = self.queryset().get(**{self.field: value})
+                data = pickle.dumps(instance, pickle.HIGHEST_PROTOCOL)
+                cache.set(key, data, settings.OBJECT_CACHE_TIMEOUT)
+            self.local.set(key, data)
+        return pickle.loads(data)
+
+    def get_or_404(self, value):
+        try:
+            return self.get(value)
+        except self.model.DoesNotExist:
+            raise Http404(f'{self.model._meta.object_name} не найден')
+
+    def invalidate(self, *values):
+        keys = [self.key(value) for value in values]
+        for key in keys:
+            self.local.delete(key)
+        cache.delete_many(keys)
+
+    def remember_value(self, sender, instance, **kwargs):
+        if self.attname in instance.__dict__:
+            instance._object_cache_values = getattr(
+                instance, '_object_cache_values', {}
+            )
+            instance._object_cache_values[self.name] = getattr(
+                instance, self.attname
+            )
+
+    def invalidate_instance(self, sender, instance, **kwargs):
+        value = getattr(instance, self.field)
+        old_value = getattr(
+            instance, '_object_cache_values', {}
+        ).get(self.name, value)
+        self.invalidate(*{value, old_value})
+        if self.attname:
+            self.remember_value(sender, instance)
+
+    def connect(self):
+        """Подключает сброс к сигналам модели."""
+        model = self.model = self.queryset().model
+        uid = f'object_cache:{self.name}'
+        if self.field != 'pk':
+            self.attname = model._meta.get_field(self.field).attname
+            post_init.connect(
+                self.remember_value, sender=model, dispatch_uid=uid
+            )
+        post_save.connect(
+            self.invalidate_instance, sender=model, dispatch_uid=uid
+        )
+        post_delete.connect(
+            self.invalidate_instance, sender=model, dispatch_uid=uid
+        )
+        return self
@@ -0,0 +1,275 @@
+import hashlib
+import math
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from time import monotonic, sleep, time, time_ns
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.timezone import utc
+from django.views.decorators.http import condition
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+LOCK_POLL_INTERVAL = 0.05
+STATS = ('hit', 'miss', 'stale', 'refresh', 'lock_wait')
+
+
+def generation_key(tag):
+    return f'tag_generation:{quote(tag)}'
+
+
+def get_generations(tags):
+    """Возвращает текущие поколения тегов, заводя недостающие.
+
+    Поколение — время последнего изменения тега в наносекундах, поэтому
+    оно же служит Last-Modified. Недостающий тег получает текущее время:
+    если ключ поколения вытеснен из кэша, страницы, собранные при старом
+    поколении, уже не совпадут с новым.
+    """
+    keys = [generation_key(tag) for tag in tags]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_tags(*tags):
+    """Делает недействительными все страницы, помеченные этими тегами."""
+    now = time_ns()
+    cache.set_many({generation_key(tag): now for tag in tags}, None)
+
+
+def request_generations(request, tags):
+    """Поколения тегов страницы, прочитанные один раз за запрос."""
+    if not hasattr(request, '_tag_generations'):
+        request._tag_generations = get_generations(tags)
+    return request._tag_generations
+
+
+def tag_validators(tags):
+    """Conditional GET по поколениям тегов страницы без запросов к базе.
+
+    ETag зависит ещё и от пользователя, если страница не публичная.
+    """
+    def etag(request, *args, **kwargs):
+        generations = request_generations(
+            request, tags(request, *args, **kwargs)
+        )
+        viewer = (
+            'public' if is_public_shell(request) else request.user.pk
+        )
+        return hashlib.md5(
+            f'{viewer}:{generations}'.encode()
+        ).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        generations = request_generations(
+            request, tags(request, *args, **kwargs)
+        )
+        return datetime.fromtimestamp(max(generations) / 10 ** 9, utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def stat_key(name):
+    return f'page_cache_stats:{name}'
+
+
+class StatsBuffer:
+    """Счётчики событий кэша в памяти процесса.
+
+    В общий кэш они уходят одним incr на счётчик не чаще раза
+    в PAGE_CACHE_STATS_FLUSH_INTERVAL секунд, а не записью на каждый
+    запрос. Несброшенные события процесса видит только он сам.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.flushed = monotonic()
+
+    def add(self, name):
+        with self.lock:
+            self.counts[name] += 1
+            interval = settings.PAGE_CACHE_STATS_FLUSH_INTERVAL
+            if monotonic() - self.flushed < interval:
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.flushed = monotonic()
+        for name, value in counts.items():
+            key = stat_key(name)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+stats_buffer = StatsBuffer()
+
+
+def count_stat(name):
+    stats_buffer.add(name)
+
+
+def get_stats():
+    stats_buffer.flush()
+    values = cache.get_many([stat_key(name) for name in STATS])
+    return {name: values.get(stat_key(name), 0) for name in STATS}
+
+
+def reset_stats():
+    stats_buffer.clear()
+    cache.delete_many([stat_key(name) for name in STATS])
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def is_fresh(expires, delta):
+    """Вероятностное досрочное обновление (XFetch).
+
+    Чем ближе срок и чем дольше пересчёт, тем вероятнее, что запрос
+    сочтёт копию устаревшей и обновит её заранее.
+    """
+    beta = settings.PAGE_CACHE_EARLY_BETA
+    jitter = -delta * beta * math.log(1 - random.random())
+    return time() + jitter < expires
+
+
+def wait_for_value(key):
+    """Ждёт, пока значение посчитает запрос, взявший блокировку."""
+    count_stat('lock_wait')
+    deadline = time() + settings.PAGE_CACHE_LOCK_WAIT
+    while time() < deadline:
+        sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return None
+
+
+def compute_and_store(key, compute, timeout, cacheable):
+    started = time()
+    try:
+        value = compute()
+        if cacheable is None or cacheable(value):
+            delta = time() - started
+            cache.set(
+                key, (value, time() + timeout, delta),
+                timeout + settings.PAGE_CACHE_STALE_TIMEOUT,
+            )
+    finally:
+        cache.delete(lock_key(key))
+    return value
+
+
+def get_or_compute(key, compute, timeout=None, cacheable=None):
+    """Достаёт значение из кэша, не допуская лавины пересчётов.
+
+    Копия живёт timeout секунд и ещё PAGE_CACHE_STALE_TIMEOUT после
+    этого. Пересчитывает только запрос, взявший блокировку в кэше,
+    остальные отдают устаревшую копию, а при её отсутствии ждут до
+    PAGE_CACHE_LOCK_WAIT секунд.
+    """
+    if timeout is None:
+        timeout = settings.PAGE_CACHE_TIMEOUT
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if is_fresh(expires, delta):
+            count_stat('hit')
+            return value
+        if not cache.add(lock_key(key), 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+            count_stat('stale')
+            return value
+        count_stat('refresh')
+        return compute_and_store(key, compute, timeout, cacheable)
+    count_stat('miss')
+    if not cache.add(lock_key(key), 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+        value = wait_for_value(key)
+        if value is not None:
+            return value
+    return compute_and_store(key, compute, timeout, cacheable)
+
+
+def page_key(request, key_prefix, tags):
+    generations = '.'.join(map(str, request_generations(request, tags)))
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    user = 'public' if is_public_shell(request) else request.user.pk or 'anon'
+    return (
+        f'tagged_page:{key_prefix}:{request.method}:{user}:'
+        f'{generations}:{path}'
+    )
+
+
+def is_public_shell(request):
+    return getattr(request, 'public_shell', False)
+
+
+def public_page(view):
+    """Отдаёт страницу одинаковой для всех пользователей.
+
+    Шаблоны видят request.public_shell и не обращаются к пользователю и
+    сессии, поэтому анонимы не получают cookie, ответ не зависит от
+    Cookie и помечается как публичный. Части для вошедшего подставляет
+    на клиенте отдельный запрос. Выключается PUBLIC_PAGE_SHELLS = False.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.PUBLIC_PAGE_SHELLS:
+            return view(request, *args, **kwargs)
+        request.public_shell = True
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            patch_cache_control(
+                response, public=True, max_age=settings.PUBLIC_PAGE_MAX_AGE
+            )
+        return response
+
+    return wrapper
+
+
+def is_cacheable_response(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def tagged_cache_page(tags, timeout=None, key_prefix=''):
+    """Кэширует страницу до изменения любого из её тегов.
+
+    tags вызывается с аргументами view и возвращает список тегов.
+    Ключ страницы содержит поколения тегов, поэтому bump_tags сразу
+    отправляет все старые копии в промах, и таймаут можно держать
+    большим. Страницы кэшируются отдельно для каждого пользователя,
+    а публичные страницы (public_page) — одной копией на всех.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in CACHEABLE_METHODS:
+                return view(request, *args, **kwargs)
+            return get_or_compute(
+                page_key(request, key_prefix, tags(request, *args, **kwargs)),
+                lambda: view(request, *args, **kwargs),
+                timeout,
+                is_cacheable_response,
+            )
+
+        return wrapper
+    return decorator
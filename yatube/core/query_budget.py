@@ -0,0 +1,70 @@
+import logging
+from functools import wraps
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COST_MS = 250
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """Обёртка выполнения SQL, считающая запросы и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += perf_counter() - started
+
+    @property
+    def cost_ms(self):
+        return self.duration * 1000
+
+
+def check_budget(name, counter, queries, cost_ms):
+    problems = []
+    if counter.count > queries:
+        problems.append(f'{counter.count} запросов при лимите {queries}')
+    if counter.cost_ms > cost_ms:
+        problems.append(
+            f'{counter.cost_ms:.1f} мс в базе при лимите {cost_ms} мс'
+        )
+    if not problems:
+        return
+    message = f'{name} превысил бюджет: ' + ', '.join(problems)
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def query_budget(queries, cost_ms=DEFAULT_COST_MS):
+    """Ограничивает число SQL-запросов и время в базе на один вызов view.
+
+    Превышение пишется в лог, а при QUERY_BUDGET_STRICT вызывает
+    QueryBudgetExceeded.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            check_budget(view.__qualname__, counter, queries, cost_ms)
+            return response
+
+        wrapper.query_budget = (queries, cost_ms)
+        return wrapper
+    return decorator
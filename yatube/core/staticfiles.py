@@ -0,0 +1,69 @@
+import gzip
+import os
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Картинки и шрифты уже сжаты, а текстовые форматы сжимаются в разы.
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.json', '.map', '.svg', '.txt', '.xml', '.html',
+    '.ico', '.eot', '.ttf', '.otf',
+)
+# Сжатая копия пишется, только если она заметно меньше исходной.
+MIN_COMPRESSION_RATIO = 0.95
+
+
+def compressors():
+    """(расширение, функция) для доступных алгоритмов сжатия."""
+    items = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        items.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return items
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и сжатыми копиями рядом.
+
+    collectstatic кладёт в STATIC_ROOT файлы вида logo.<md5>.png,
+    манифест staticfiles.json и для текстовых форматов соседние .gz
+    и .br (если установлен brotli), которые отдаёт core.file_serving.
+
+    Манифест читается один раз при создании хранилища, и {% static %}
+    ищет имя только в словаре в памяти. Файла, которого нет в
+    манифесте, например до первого collectstatic, ссылка ведёт на
+    исходное имя, а не падает и не читает диск.
+    """
+
+    def stored_name(self, name):
+        parsed_name = urlsplit(unquote(name))
+        clean_name = parsed_name.path.strip()
+        parsed_name = parsed_name._replace(path=self.hashed_files.get(
+            self.hash_key(clean_name), clean_name
+        ))
+        return urlunsplit(parsed_name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            self.compress(name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with self.open(name) as original:
+            data = original.read()
+        for extension, compress in compressors():
+            compressed = compress(data)
+            compressed_name = name + extension
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            if len(compressed) < len(data) * MIN_COMPRESSION_RATIO:
+                self._save(compressed_name, ContentFile(compressed))
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import StoredFile
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — хеш его содержимого.
+
+    Одинаковые загрузки попадают в один файл: каталог из upload_to
+    сохраняется, а имя заменяется на sha256 с исходным расширением.
+    Каждое сохранение добавляет файлу ссылку в StoredFile, release
+    убирает её, и файл удаляется вместе с последней ссылкой.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self._save(self.content_name(name, content), content)
+        StoredFile.objects.get_or_create(
+            name=name, defaults={'size': content.size}
+        )
+        StoredFile.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Параллельная загрузка того же содержимого пишет те же байты,
+        # поэтому достаточно атомарно подменить файл готовой копией.
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return name
+
+    def release(self, name):
+        """Убирает ссылку на файл; True, если файл удалён."""
+        with transaction.atomic():
+            StoredFile.objects.filter(name=name, references__gt=0).update(
+                references=F('references') - 1
+            )
+            deleted, _ = StoredFile.objects.filter(
+                name=name, references=0
+            ).delete()
+        if deleted:
+            self.delete(name)
+        return bool(deleted)
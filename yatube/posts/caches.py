@@ -0,0 +1,12 @@
+from core.object_cache import ObjectCache
+
+from .models import Group, Post, User
+
+post_cache = ObjectCache(
+    'post', lambda: Post.objects.select_related('author', 'group')
+).connect()
+group_cache = ObjectCache('group', Group.objects.all, field='slug').connect()
+user_cache = ObjectCache(
+    'user', lambda: User.objects.select_related('counters'),
+    field='username',
+).connect()
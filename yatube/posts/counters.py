@@ -0,0 +1,129 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+RECOUNT_BATCH_SIZE = 500
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно сдвигает счётчик через F-выражение, не уходя ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_user_counter(user_id, field, delta):
+    if user_id is None:
+        return
+    counters = UserCounters.objects.filter(user_id=user_id)
+    if change_counter(counters, field, delta) or delta < 0:
+        return
+    UserCounters.objects.get_or_create(user_id=user_id)
+    change_counter(counters, field, delta)
+
+
+def change_post_counters(author_id, group_id, delta):
+    change_user_counter(author_id, 'posts_count', delta)
+    if group_id is not None:
+        change_counter(
+            Group.objects.filter(pk=group_id), 'posts_count', delta
+        )
+
+
+def change_comment_counter(post_id, delta):
+    if post_id is not None:
+        change_counter(
+            Post.objects.filter(pk=post_id), 'comments_count', delta
+        )
+
+
+def change_follow_counters(user_id, author_id, delta):
+    change_user_counter(user_id, 'following_count', delta)
+    change_user_counter(author_id, 'followers_count', delta)
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю запись."""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _batches(model, batch_size):
+    """Отдаёт первичные ключи пачками, проходя таблицу по индексу."""
+    queryset = model.objects.order_by('pk').values_list('pk', flat=True)
+    pks = list(queryset[:batch_size])
+    while pks:
+        yield pks
+        pks = list(queryset.filter(pk__gt=pks[-1])[:batch_size])
+
+
+def _repair(objects, totals):
+    """Выставляет объектам верные значения; возвращает изменённые."""
+    drifted = []
+    for obj in objects:
+        changed = False
+        for field, total in totals(obj).items():
+            if getattr(obj, field) != total:
+                setattr(obj, field, total)
+                changed = True
+        if changed:
+            drifted.append(obj)
+    return drifted
+
+
+def recount_groups(batch_size=RECOUNT_BATCH_SIZE):
+    repaired = 0
+    for pks in _batches(Group, batch_size):
+        groups = Group.objects.filter(pk__in=pks).annotate(
+            total=count_of(Post, 'group')
+        )
+        drifted = _repair(groups, lambda group: {
+            'posts_count': group.total,
+        })
+        Group.objects.bulk_update(drifted, ['posts_count'])
+        repaired += len(drifted)
+    return repaired
+
+
+def recount_posts(batch_size=RECOUNT_BATCH_SIZE):
+    repaired = 0
+    for pks in _batches(Post, batch_size):
+        posts = Post.objects.filter(pk__in=pks).only(
+            'pk', 'comments_count'
+        ).annotate(total=count_of(Comment, 'post'))
+        drifted = _repair(posts, lambda post: {
+            'comments_count': post.total,
+        })
+        Post.objects.bulk_update(drifted, ['comments_count'])
+        repaired += len(drifted)
+    return repaired
+
+
+def recount_users(batch_size=RECOUNT_BATCH_SIZE):
+    repaired = 0
+    fields = ['posts_count', 'followers_count', 'following_count']
+    for pks in _batches(User, batch_size):
+        UserCounters.objects.bulk_create(
+            (UserCounters(user_id=pk) for pk in pks),
+            ignore_conflicts=True,
+        )
+        counters = UserCounters.objects.filter(user_id__in=pks).annotate(
+            posts=count_of(Post, 'author'),
+            followers=count_of(Follow, 'author'),
+            following=count_of(Follow, 'user'),
+        )
+        drifted = _repair(counters, lambda counter: {
+            'posts_count': counter.posts,
+            'followers_count': counter.followers,
+            'following_count': counter.following,
+        })
+        UserCounters.objects.bulk_update(drifted, fields)
+        repaired += len(drifted)
+    return repaired
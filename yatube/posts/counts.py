@@ -0,0 +1,114 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Max
+
+from .models import Post
+
+COUNT_KEY_PREFIX = 'posts_count'
+
+
+def count_key(scope='all', pk=None):
+    return f'{COUNT_KEY_PREFIX}:{scope}:{pk}'
+
+
+def post_count_keys(author_id, group_id):
+    """Ключи счётчиков, в которые входит пост с таким автором и группой."""
+    keys = [count_key(), count_key('author', author_id)]
+    if group_id is not None:
+        keys.append(count_key('group', group_id))
+    return keys
+
+
+def adjust_counts(keys, delta):
+    """Сдвигает закэшированные счётчики; отсутствующие не создаются.
+
+    Какие ключи есть в кэше, выясняется одним чтением, и на запись
+    идут только они.
+    """
+    for key in cache.get_many(list(keys)):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+
+def move_group_count(old_group_id, new_group_id):
+    if old_group_id is not None:
+        adjust_counts([count_key('group', old_group_id)], -1)
+    if new_group_id is not None:
+        adjust_counts([count_key('group', new_group_id)], 1)
+
+
+def cached_count(key, queryset):
+    count = cache.get(key)
+    if count is None:
+        count = compute_count(queryset)
+        cache.add(key, count, timeout=settings.POSTS_COUNT_TIMEOUT)
+    return count
+
+
+def cached_author_counts(author_ids):
+    """Число постов каждого автора из кэша.
+
+    Счётчики, которых нет в кэше, считаются одним запросом
+    с группировкой по автору и кладутся в кэш.
+    """
+    keys = {count_key('author', author_id): author_id
+            for author_id in author_ids}
+    cached = cache.get_many(keys)
+    counts = {keys[key]: count for key, count in cached.items()}
+    missing = [author_id for author_id in author_ids
+               if author_id not in counts]
+    if missing:
+        computed = dict(
+            Post.objects.filter(author_id__in=missing).order_by()
+            .values('author_id').annotate(count=Count('pk'))
+            .values_list('author_id', 'count')
+        )
+        for author_id in missing:
+            counts[author_id] = computed.get(author_id, 0)
+            cache.add(
+                count_key('author', author_id),
+                counts[author_id],
+                timeout=settings.POSTS_COUNT_TIMEOUT,
+            )
+    return counts
+
+
+def compute_count(queryset):
+    """Считает записи точно, а в приближённом режиме — точно только
+    для выборок не больше POSTS_COUNT_EXACT_LIMIT."""
+    queryset = queryset.order_by()
+    if not settings.POSTS_COUNT_APPROXIMATE:
+        return queryset.count()
+    limit = settings.POSTS_COUNT_EXACT_LIMIT
+    count = queryset[:limit + 1].count()
+    if count <= limit:
+        return count
+    estimate = estimate_count(queryset)
+    if estimate is None:
+        return queryset.count()
+    return max(estimate, count)
+
+
+def estimate_count(queryset):
+    """Оценка числа строк без полного прохода по таблице.
+
+    PostgreSQL отдаёт оценку планировщика для любого запроса, для прочих
+    баз без фильтра берётся максимальный первичный ключ.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+    if not queryset.query.where:
+        return queryset.aggregate(last=Max('pk'))['last'] or 0
+    return None
@@ -0,0 +1,226 @@
+import base64
+import json
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete as delete_thumbnails
+
+from .models import Post
+
+# Карточка показывает картинку в пропорции прежней миниатюры 960x339.
+CARD_ASPECT = 339 / 960
+VARIANT_WIDTHS = (320, 640, 960, 1920)
+VARIANT_DIR = 'variants'
+# Ширина карточки: во всю ширину экрана на телефонах, иначе 960px.
+CARD_SIZES = '(max-width: 960px) 100vw, 960px'
+# Заглушка шириной 20px весит несколько сотен байт и встраивается
+# прямо в страницу.
+PLACEHOLDER_WIDTH = 20
+DOMINANT_COLORS = 5
+# Поля поста, которые вычисляются из картинки после загрузки.
+DERIVED_FIELDS = (
+    'image_width', 'image_height', 'image_variants', 'image_color',
+)
+
+# (тип, формат Pillow, расширение, параметры сохранения).
+# Современные форматы идут первыми и включаются, только если Pillow
+# собран с их поддержкой. JPEG есть всегда и служит запасным.
+FORMATS = (
+    ('image/avif', 'AVIF', 'avif', {'quality': 60}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 80, 'method': 6}),
+    ('image/jpeg', 'JPEG', 'jpg', {
+        'quality': 82, 'optimize': True, 'progressive': True,
+    }),
+)
+
+
+def supported_formats():
+    Image.init()
+    return [item for item in FORMATS if item[1] in Image.SAVE]
+
+
+def crop_to_aspect(image, aspect):
+    """Обрезает картинку по центру до пропорции высота/ширина."""
+    width, height = image.size
+    if height / width > aspect:
+        crop_height = max(round(width * aspect), 1)
+        top = (height - crop_height) // 2
+        return image.crop((0, top, width, top + crop_height))
+    crop_width = max(round(height / aspect), 1)
+    left = (width - crop_width) // 2
+    return image.crop((left, 0, left + crop_width, height))
+
+
+def variant_widths(width):
+    """Ширины не больше исходной; для маленькой картинки — её ширина."""
+    return [size for size in VARIANT_WIDTHS if size <= width] or [width]
+
+
+def encode(image, pil_format, options):
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        if image.mode in ('RGBA', 'LA'):
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = BytesIO()
+    # Без exif и icc_profile метаданные исходника не попадают в файл.
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def open_image(name):
+    """Декодирует картинку из хранилища, повёрнутую по EXIF, в RGB(A)."""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert(
+            'RGBA' if 'transparency' in image.info else 'RGB'
+        )
+    return image
+
+
+def variant_name(name, width, extension):
+    stem = os.path.splitext(name)[0]
+    return f'{VARIANT_DIR}/{stem}-{width}w.{extension}'
+
+
+def save_variants(name, card):
+    """Сохраняет копии обрезанной картинки нужных ширин во всех форматах.
+
+    Возвращает варианты в виде {тип: [[имя, ширина, высота], ...]}.
+    """
+    variants = {}
+    for mime, pil_format, extension, options in supported_formats():
+        sources = variants[mime] = []
+        for width in variant_widths(card.width):
+            height = max(round(width * CARD_ASPECT), 1)
+            resized = card.resize((width, height), Image.LANCZOS)
+            path = variant_name(name, width, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            path = default_storage.save(
+                path, ContentFile(encode(resized, pil_format, options))
+            )
+            sources.append([path, width, height])
+    return variants
+
+
+def placeholder(card):
+    """Крошечная копия карточки как data URI для показа до загрузки."""
+    height = max(round(PLACEHOLDER_WIDTH * CARD_ASPECT), 1)
+    tiny = card.resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR)
+    data = encode(tiny, 'JPEG', {'quality': 50})
+    return 'data:image/jpeg;base64,' + base64.b64encode(data).decode()
+
+
+def dominant_color(card):
+    """Самый частый цвет после сведения картинки к нескольким цветам."""
+    small = card.convert('RGB').resize((64, 64), Image.BILINEAR)
+    palette = small.quantize(colors=DOMINANT_COLORS)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def derive_fields(name):
+    """Значения производных полей поста для картинки из хранилища."""
+    image = open_image(name)
+    card = crop_to_aspect(image, CARD_ASPECT)
+    variants = save_variants(name, card)
+    # Заглушка живёт в JSON вариантов: отдельная широкая колонка
+    # утяжелила бы строку поста, которую читают все ленты.
+    variants['placeholder'] = placeholder(card)
+    return {
+        'image_width': image.width,
+        'image_height': image.height,
+        'image_variants': json.dumps(variants),
+        'image_color': dominant_color(card),
+    }
+
+
+def clear_derived_fields(post):
+    """Сбрасывает производные поля, когда у поста меняется картинка."""
+    for field in DERIVED_FIELDS:
+        setattr(post, field, Post._meta.get_field(field).get_default())
+
+
+def is_derived(post):
+    return all(getattr(post, field) for field in DERIVED_FIELDS)
+
+
+def record_variants(name):
+    """Записывает варианты и заглушку во все посты с этой картинкой.
+
+    Картинки хранятся по содержимому, поэтому у повторной загрузки
+    могут быть посты с готовыми полями: они переиспользуются.
+    """
+    posts = list(Post.objects.filter(image=name))
+    pending = [post for post in posts if not is_derived(post)]
+    if not pending:
+        return
+    ready = next((post for post in posts if is_derived(post)), None)
+    if ready is None:
+        fields = derive_fields(name)
+    else:
+        fields = {field: getattr(ready, field) for field in DERIVED_FIELDS}
+    for post in pending:
+        for field, value in fields.items():
+            setattr(post, field, value)
+        # Сохранение через save сбрасывает кэш страниц и карточек.
+        post.save(update_fields=(*DERIVED_FIELDS, 'modified'))
+
+
+def delete_derived(name):
+    """Удаляет миниатюры sorl и варианты картинки."""
+    delete_thumbnails(name, delete_file=False)
+    directory = os.path.dirname(variant_name(name, 0, ''))
+    prefix = os.path.splitext(os.path.basename(name))[0] + '-'
+    if not default_storage.exists(directory):
+        return
+    for filename in default_storage.listdir(directory)[1]:
+        if filename.startswith(prefix):
+            default_storage.delete(f'{directory}/{filename}')
+
+
+def release_image(name):
+    """Убирает ссылку на картинку и чистит производные от удалённой."""
+    storage = Post._meta.get_field('image').storage
+    if storage.release(name):
+        delete_derived(name)
+
+
+def picture(post):
+    """Данные для <picture>: источники по типам и запасной <img>."""
+    variants = post.variants
+    fallback = variants.get('image/jpeg')
+    if not fallback:
+        return None
+    sources = [
+        {'type': mime, 'srcset': srcset(variants[mime])}
+        for mime, *_ in FORMATS
+        if mime != 'image/jpeg' and variants.get(mime)
+    ]
+    src, width, height = fallback[-1]
+    return {
+        'sources': sources,
+        'src': default_storage.url(src),
+        'srcset': srcset(fallback),
+        'sizes': CARD_SIZES,
+        'width': width,
+        'height': height,
+        'placeholder': variants.get('placeholder', ''),
+        'color': post.image_color,
+    }
+
+
+def srcset(items):
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w' for name, width, _ in items
+    )
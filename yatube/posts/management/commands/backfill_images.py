@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import build_image
+
+BACKFILL_BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит миниатюры, варианты, заглушку и основной цвет для '
+        'картинок постов, у которых их ещё нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BACKFILL_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Обработать не больше стольких картинок',
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='').filter(image_color='')
+            .order_by('image').values_list('image', flat=True).distinct()
+        )
+        limit = options['limit']
+        processed = failed = 0
+        last = ''
+        while limit is None or processed + failed < limit:
+            # Курсор по имени: картинки с ошибкой не выбираются повторно.
+            batch = list(
+                names.filter(image__gt=last)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            for name in batch:
+                if limit is not None and processed + failed >= limit:
+                    break
+                try:
+                    build_image(name)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    processed += 1
+            last = batch[-1]
+        self.stdout.write(
+            f'Картинок обработано: {processed}, с ошибками: {failed}'
+        )
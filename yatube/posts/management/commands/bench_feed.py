@@ -0,0 +1,100 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Follow, Post, TimelineEntry, UserCounters
+from posts.timeline import HomeFeed
+from posts.utils import POSTS_ON_ONE_PAGE
+
+User = get_user_model()
+
+DEFAULT_SIZES = '10,100,1000,10000,100000,1000000'
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет стоимость записи и чтения ленты для автора с разным '
+        'числом подписчиков при настоящем TIMELINE_PULL_THRESHOLD. '
+        'Данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES)
+        parser.add_argument('--light-authors', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=POSTS_ON_ONE_PAGE)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write(
+            f'{"followers":>10} {"mode":>5} {"write ms":>10} '
+            f'{"rows":>8} {"read ms":>8} {"queries":>7}'
+        )
+        for size in sizes:
+            mode = (
+                'pull' if size >= settings.TIMELINE_PULL_THRESHOLD
+                else 'push'
+            )
+            row = self.measure(size, options)
+            self.stdout.write(
+                f'{size:>10} {mode:>5} {row["write"]:>10.2f} '
+                f'{row["rows"]:>8} {row["read"]:>8.2f} '
+                f'{row["queries"]:>7}'
+            )
+
+    def measure(self, size, options):
+        with transaction.atomic():
+            reader, author = self.seed(size, options)
+            rows_before = TimelineEntry.objects.count()
+            started = perf_counter()
+            Post.objects.create(author=author, text='Замер')
+            write = perf_counter() - started
+            rows = TimelineEntry.objects.count() - rows_before
+            with CaptureQueriesContext(connection) as queries:
+                started = perf_counter()
+                list(HomeFeed(reader)[:POSTS_ON_ONE_PAGE])
+                read = perf_counter() - started
+            transaction.set_rollback(True)
+        return {
+            'write': write * 1000,
+            'rows': rows,
+            'read': read * 1000,
+            'queries': len(queries),
+        }
+
+    def seed(self, size, options):
+        prefix = f'bench{size}'
+        author = User.objects.create_user(username=f'{prefix}_author')
+        reader = User.objects.create_user(username=f'{prefix}_reader')
+        for i in range(options['light_authors']):
+            light_author = User.objects.create_user(
+                username=f'{prefix}_light{i}'
+            )
+            Follow.objects.create(user=reader, author=light_author)
+            for i in range(options['posts']):
+                Post.objects.create(author=light_author, text=f'Пост {i}')
+        for i in range(options['posts']):
+            Post.objects.create(author=author, text=f'Пост {i}')
+        Follow.objects.create(user=reader, author=author)
+        User.objects.bulk_create(
+            User(username=f'{prefix}_fan{i}', password='!')
+            for i in range(size - 1)
+        )
+        fans = User.objects.filter(
+            username__startswith=f'{prefix}_fan'
+        ).values_list('pk', flat=True)
+        Follow.objects.bulk_create(
+            Follow(user_id=pk, author=author) for pk in fans.iterator()
+        )
+        # bulk_create обходит сигналы: счётчик и переход автора в pull
+        # выставляются так же, как это сделали бы обработчики подписок.
+        pull = size >= settings.TIMELINE_PULL_THRESHOLD
+        UserCounters.objects.filter(user=author).update(
+            followers_count=size, timeline_pull=pull
+        )
+        if pull:
+            TimelineEntry.objects.filter(author=author).delete()
+        return reader, author
@@ -0,0 +1,112 @@
+import os
+
+from core.models import StoredFile
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.images import (DERIVED_FIELDS, clear_derived_fields,
+                          delete_derived)
+from posts.models import Post
+from posts.thumbnails import process_image
+
+UPLOAD_DIR = 'posts'
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки из media/posts в хранилище по содержимому: '
+        'одинаковые файлы сливаются в один, посты переводятся на новые '
+        'имена, число ссылок пересчитывается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет сделано',
+        )
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        stats = dict.fromkeys(
+            ('files', 'hashed', 'moved', 'duplicates', 'freed'), 0
+        )
+        targets = set()
+        renamed = set()
+        for name in self.upload_names():
+            stats['files'] += 1
+            with self.storage.open(name) as content:
+                target = self.storage.content_name(name, File(content))
+            if target == name:
+                stats['hashed'] += 1
+                continue
+            if target in targets or self.storage.exists(target):
+                stats['duplicates'] += 1
+                stats['freed'] += self.storage.size(name)
+            else:
+                stats['moved'] += 1
+            targets.add(target)
+            self.stdout.write(f'{name} → {target}')
+            if not self.dry_run:
+                self.replace(name, target)
+                renamed.add(target)
+        if not self.dry_run:
+            for target in renamed:
+                process_image(target)
+            self.recount()
+        self.stdout.write(
+            f'Файлов: {stats["files"]}, уже по содержимому: '
+            f'{stats["hashed"]}, перенесено: {stats["moved"]}, '
+            f'дубликатов: {stats["duplicates"]}, '
+            f'освобождено байт: {stats["freed"]}'
+        )
+
+    def upload_names(self):
+        root = self.storage.path(UPLOAD_DIR)
+        names = []
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith('.part'):
+                    continue
+                path = os.path.join(directory, filename)
+                relative = os.path.relpath(path, self.storage.location)
+                names.append(relative.replace(os.sep, '/'))
+        return sorted(names)
+
+    def replace(self, name, target):
+        """Переводит посты на новое имя и убирает старый файл."""
+        if not self.storage.exists(target):
+            path = self.storage.path(target)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.storage.path(name), path)
+        else:
+            self.storage.delete(name)
+        # Миниатюры и варианты старого имени больше не нужны,
+        # новые соберутся или переиспользуются по новому имени.
+        delete_derived(name)
+        with transaction.atomic():
+            for post in Post.objects.filter(image=name):
+                post.image = target
+                clear_derived_fields(post)
+                post.save(update_fields=(
+                    'image', *DERIVED_FIELDS, 'modified',
+                ))
+
+    def recount(self):
+        """Выставляет число ссылок по постам, которые держат файл."""
+        references = dict(
+            Post.objects.filter(image__startswith=f'{UPLOAD_DIR}/')
+            .order_by().values_list('image').annotate(total=Count('pk'))
+        )
+        with transaction.atomic():
+            StoredFile.objects.filter(
+                name__startswith=f'{UPLOAD_DIR}/'
+            ).exclude(name__in=references).delete()
+            for name, total in references.items():
+                if not self.storage.exists(name):
+                    continue
+                StoredFile.objects.update_or_create(name=name, defaults={
+                    'size': self.storage.size(name), 'references': total,
+                })
@@ -0,0 +1,37 @@
+from core.jobs import enqueue
+from django.core.management.base import BaseCommand
+
+from posts.counters import (RECOUNT_BATCH_SIZE, recount_groups,
+                            recount_posts, recount_users)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=RECOUNT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help=(
+                'Поставить пересчёт в очередь runworker; аренда '
+                'JOBS_LEASE должна быть дольше пересчёта'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for name, recount in (
+            ('группы', recount_groups),
+            ('посты', recount_posts),
+            ('пользователи', recount_users),
+        ):
+            if options['enqueue']:
+                enqueue(f'posts.counters.{recount.__name__}', batch_size)
+                self.stdout.write(f'{name}: поставлено в очередь')
+            else:
+                repaired = recount(batch_size)
+                self.stdout.write(f'{name}: исправлено {repaired}')
+        if not options['enqueue']:
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,280 @@
+import random
+from bisect import bisect
+from collections import Counter
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+from time import perf_counter
+
+from core.models import StoredFile
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils import timezone
+from PIL import Image
+
+from posts.counters import recount_groups, recount_posts, recount_users
+from posts.models import Comment, Follow, Group, Post
+from posts.timeline import rebuild_timelines
+
+User = get_user_model()
+
+SEED_START = datetime(2022, 1, 1, tzinfo=timezone.utc)
+IMAGE_SIZE = (960, 640)
+NO_GROUP_SHARE = 0.3
+WORDS = (
+    'яндекс', 'практикум', 'пост', 'лента', 'подписка', 'группа', 'автор',
+    'комментарий', 'картинка', 'кэш', 'индекс', 'запрос', 'страница',
+    'django', 'python', 'тест', 'сегодня', 'вчера', 'новость', 'код',
+)
+
+
+class Zipf:
+    """Выбор элементов с вероятностью, обратной рангу в степени s."""
+
+    def __init__(self, items, rng, s):
+        self.items = items
+        self.rng = rng
+        self.weights = list(accumulate(
+            1 / rank ** s for rank in range(1, len(items) + 1)
+        ))
+
+    def __call__(self):
+        point = self.rng.random() * self.weights[-1]
+        return self.items[bisect(self.weights, point)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу большим детерминированным набором пользователей, '
+        'групп, постов, комментариев и подписок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения авторов, групп и подписок',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Размер пула картинок; 0 — посты без картинок',
+        )
+        parser.add_argument('--image-share', type=float, default=0.2)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать ленты и счётчики после вставки',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {self.prefix} уже есть, '
+                'задайте другой --prefix'
+            )
+        users = self.stage('пользователи', self.seed_users)
+        groups = self.stage('группы', self.seed_groups)
+        images = self.stage('картинки', self.seed_images)
+        posts = self.stage('посты', self.seed_posts, users, groups, images)
+        self.release_images(images)
+        self.stage('комментарии', self.seed_comments, users, posts)
+        self.stage('подписки', self.seed_follows, users)
+        if not options['skip_derived']:
+            self.stage('счётчики групп', recount_groups)
+            self.stage('счётчики постов', recount_posts)
+            self.stage('счётчики пользователей', recount_users)
+            self.stage('ленты', rebuild_timelines)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def stage(self, name, func, *args):
+        started = perf_counter()
+        with transaction.atomic():
+            result = func(*args)
+        self.stdout.write(f'{name}: {perf_counter() - started:.1f} с')
+        return result
+
+    def insert(self, model, objects):
+        fields = model._meta.concrete_fields
+        batch_size = self.options['batch_size']
+        keep_created = any(
+            getattr(field, 'auto_now_add', False) for field in fields
+        )
+        while True:
+            batch = list(islice(objects, batch_size))
+            if not batch:
+                return
+            size = min(
+                batch_size, connection.ops.bulk_batch_size(fields, batch)
+            )
+            if keep_created:
+                # bulk_create заменяет created текущим временем
+                # (auto_now_add), поэтому заданное время ставится
+                # следом отдельным UPDATE.
+                created = [obj.created for obj in batch]
+                last = model.objects.order_by('-pk').values_list(
+                    'pk', flat=True
+                ).first() or 0
+            model.objects.bulk_create(batch, batch_size=size)
+            if keep_created:
+                self.set_created(model, last, created)
+
+    def set_created(self, model, last, created):
+        """Проставляет created строкам, вставленным после pk last,
+        в порядке вставки."""
+        pks = model.objects.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', flat=True
+        )
+        rows = list(zip(pks, created))
+        step = connection.features.max_query_params // 2 - 1
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            model.objects.filter(
+                pk__gte=chunk[0][0], pk__lte=chunk[-1][0]
+            ).update(created=Case(
+                *(When(pk=pk, then=Value(value)) for pk, value in chunk),
+                output_field=DateTimeField(),
+            ))
+
+    def created_at(self):
+        seconds = self.rng.randrange(self.options['days'] * 24 * 60 * 60)
+        return SEED_START + timedelta(
+            seconds=seconds, microseconds=self.rng.randrange(10 ** 6)
+        )
+
+    def text(self, words):
+        return ' '.join(self.rng.choices(WORDS, k=words)).capitalize()
+
+    def seed_users(self):
+        self.insert(User, (
+            User(username=f'{self.prefix}_user{i}', password='!')
+            for i in range(self.options['users'])
+        ))
+        return list(
+            User.objects.filter(username__startswith=f'{self.prefix}_user')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def seed_groups(self):
+        self.insert(Group, (
+            Group(
+                title=f'Группа {i}',
+                slug=f'{self.prefix}-group-{i}',
+                description=self.text(12),
+            ) for i in range(self.options['groups'])
+        ))
+        return list(
+            Group.objects.filter(slug__startswith=f'{self.prefix}-group-')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def seed_images(self):
+        """Создаёт небольшой пул настоящих картинок, общий для всех постов.
+
+        Картинки сохраняются через хранилище поля image, как загрузки
+        из формы, и получают записи StoredFile.
+        """
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for i in range(self.options['images']):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            content = BytesIO()
+            Image.new('RGB', IMAGE_SIZE, color).save(
+                content, 'JPEG', quality=85
+            )
+            names.append(storage.save(
+                f'posts/{self.prefix}_{i}.jpg', ContentFile(content.getvalue())
+            ))
+        return names
+
+    def reference_images(self, images, last_before):
+        """Добавляет файлам по ссылке на каждый вставленный пост:
+        bulk_create не вызывает storage.save."""
+        uses = Counter(
+            Post.objects.filter(pk__gt=last_before, image__in=images)
+            .values_list('image', flat=True).iterator()
+        )
+        for name, total in uses.items():
+            StoredFile.objects.filter(name=name).update(
+                references=F('references') + total
+            )
+
+    def release_images(self, images):
+        """Снимает ссылки, взятые при сохранении в seed_images, когда
+        посты уже записаны. Файл, не доставшийся ни одному посту,
+        удаляется."""
+        storage = Post._meta.get_field('image').storage
+        for name in images:
+            storage.release(name)
+
+    def seed_posts(self, users, groups, images):
+        author = Zipf(users, self.rng, self.options['zipf'])
+        group = Zipf(groups, self.rng, self.options['zipf'])
+        share = self.options['image_share'] if images else 0
+
+        def posts():
+            for _ in range(self.options['posts']):
+                yield Post(
+                    author_id=author(),
+                    group_id=(
+                        group() if groups
+                        and self.rng.random() >= NO_GROUP_SHARE else None
+                    ),
+                    text=self.text(self.rng.randint(5, 60)),
+                    image=(
+                        self.rng.choice(images)
+                        if self.rng.random() < share else ''
+                    ),
+                    created=self.created_at(),
+                )
+
+        first = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        last_before = first.first() or 0
+        self.insert(Post, posts())
+        posts = list(
+            Post.objects.filter(pk__gt=last_before)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.reference_images(images, last_before)
+        return posts
+
+    def seed_comments(self, users, posts):
+        if not posts:
+            return
+        post = Zipf(posts, self.rng, self.options['zipf'])
+        self.insert(Comment, (
+            Comment(
+                author_id=self.rng.choice(users),
+                post_id=post(),
+                text=self.text(self.rng.randint(3, 30)),
+                created=self.created_at(),
+            ) for _ in range(self.options['comments'])
+        ))
+
+    def seed_follows(self, users):
+        """Граф подписок со степенным распределением числа подписчиков."""
+        author = Zipf(users, self.rng, self.options['zipf'])
+        target = min(
+            self.options['follows'], len(users) * (len(users) - 1)
+        )
+        pairs = set()
+        while len(pairs) < target:
+            pair = (self.rng.choice(users), author())
+            if pair[0] != pair[1]:
+                pairs.add(pair)
+        self.insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in sorted(pairs)
+        ))
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timelines(apps, schema_editor):
+    """Раскладывает уже написанные посты по лентам подписчиков.
+
+    Авторы с числом подписчиков не меньше TIMELINE_PULL_THRESHOLD
+    пропускаются: их посты лента подмешивает при чтении.
+    """
+    ops = schema_editor.connection.ops
+    entries, posts, follows = (
+        ops.quote_name(apps.get_model('posts', name)._meta.db_table)
+        for name in ('TimelineEntry', 'Post', 'Follow')
+    )
+    threshold = getattr(settings, 'TIMELINE_PULL_THRESHOLD', None)
+    where, params = '', []
+    if threshold:
+        where = (
+            f'AND f.author_id NOT IN (SELECT author_id FROM {follows} '
+            'GROUP BY author_id HAVING COUNT(*) >= %s)'
+        )
+        params = [threshold]
+    schema_editor.execute(
+        f'{ops.insert_statement(ignore_conflicts=True)} {entries} '
+        '(user_id, post_id, author_id, created) '
+        'SELECT f.user_id, p.id, p.author_id, p.created '
+        f'FROM {follows} f INNER JOIN {posts} p ON p.author_id = f.author_id '
+        f'WHERE f.user_id IS NOT NULL {where} '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+        params,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_auto_20221209_1242'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата создания поста')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ['-created', '-post_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created', '-post'], name='timeline_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_user_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
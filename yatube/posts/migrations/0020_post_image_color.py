@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7, verbose_name='Основной цвет картинки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, default='', editable=False, help_text='JSON со списком уменьшенных копий по форматам и заглушкой', verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-17 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_pull_authors(apps, schema_editor):
+    """Отмечает авторов, чьи посты уже не разложены по лентам.
+
+    Как и в 0014, это авторы с числом подписчиков не меньше
+    TIMELINE_PULL_THRESHOLD.
+    """
+    threshold = getattr(settings, 'TIMELINE_PULL_THRESHOLD', None)
+    if not threshold:
+        return
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    heavy = Follow.objects.order_by().values('author_id').annotate(
+        followers=Count('id')
+    ).filter(followers__gte=threshold).values('author_id')
+    UserCounters.objects.filter(user_id__in=heavy).update(timeline_pull=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_image_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='timeline_pull',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
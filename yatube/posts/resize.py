@@ -0,0 +1,85 @@
+import hashlib
+
+from core.disk_cache import DiskLRUCache
+from django.conf import settings
+from django.core.signing import Signer
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import Image
+
+from .images import (CARD_ASPECT, crop_to_aspect, encode, open_image,
+                     supported_formats)
+
+# Обрезка по центру до пропорции высота/ширина; fit сохраняет исходную.
+CROPS = {
+    'fit': None,
+    'card': CARD_ASPECT,
+    'square': 1.0,
+}
+
+signer = Signer(salt='posts.resize')
+_caches = {}
+
+
+def signature(name, width, crop):
+    return signer.signature(f'{name}:{width}:{crop}')
+
+
+def is_allowed(width, crop):
+    return width in settings.RESIZE_WIDTHS and crop in CROPS
+
+
+def resized_url(name, width, crop='fit'):
+    """Подписанная ссылка на картинку из хранилища нужной ширины."""
+    if not is_allowed(width, crop):
+        raise ValueError(f'Размер {width} {crop} не разрешён')
+    return reverse('posts:resized_image', args=[
+        signature(name, width, crop), width, crop, name,
+    ])
+
+
+def is_valid(sign, name, width, crop):
+    return is_allowed(width, crop) and constant_time_compare(
+        sign, signature(name, width, crop)
+    )
+
+
+def get_cache():
+    """Дисковый кэш из настроек, один на процесс для каждых настроек."""
+    options = (settings.RESIZE_CACHE_DIR, settings.RESIZE_CACHE_MAX_BYTES)
+    if options not in _caches:
+        _caches[options] = DiskLRUCache(*options)
+    return _caches[options]
+
+
+def choose_format(accept):
+    """Первый поддерживаемый формат из Accept; JPEG понимают все."""
+    for item in supported_formats():
+        if item[0] == 'image/jpeg' or item[0] in accept:
+            return item
+    raise ValueError('Pillow не умеет сохранять JPEG')
+
+
+def render(name, width, crop, pil_format, options):
+    image = open_image(name)
+    if CROPS[crop] is not None:
+        image = crop_to_aspect(image, CROPS[crop])
+    # Увеличивать картинку смысла нет: браузер растянет её сам.
+    width = min(width, image.width)
+    height = max(round(image.height * width / image.width), 1)
+    resized = image.resize((width, height), Image.LANCZOS)
+    return encode(resized, pil_format, options)
+
+
+def resized_file(name, width, crop, accept=''):
+    """Путь к готовой копии в дисковом кэше и её тип.
+
+    Параллельные запросы одной копии ждут друг друга, и исходник
+    декодируется один раз.
+    """
+    mime, pil_format, _, options = choose_format(accept)
+    key = hashlib.md5(f'{name}:{width}:{crop}:{mime}'.encode()).hexdigest()
+    path, _ = get_cache().get_or_create(
+        key, lambda: render(name, width, crop, pil_format, options)
+    )
+    return path, mime
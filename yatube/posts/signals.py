@@ -0,0 +1,168 @@
+from core.page_cache import bump_tags
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import counters, thumbnails, timeline
+from .caches import post_cache, user_cache
+from .counts import adjust_counts, move_group_count, post_count_keys
+from .images import release_image
+from .models import Comment, Follow, Group, Post
+from .tags import (INDEX_TAG, comment_tags, follow_usernames, group_tag,
+                   post_tags, profile_tag)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    if 'group_id' in instance.__dict__:
+        instance._counted_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post_pages(sender, instance, created, **kwargs):
+    # Подключён раньше count_saved_post, пока _counted_group_id
+    # ещё хранит прежнюю группу.
+    old_group_id = getattr(instance, '_counted_group_id', None)
+    bump_tags(*post_tags(instance, {old_group_id, instance.group_id}))
+    if created:
+        user_cache.invalidate(instance.author.username)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_counts(
+            post_count_keys(instance.author_id, instance.group_id), 1
+        )
+        counters.change_post_counters(
+            instance.author_id, instance.group_id, 1
+        )
+    else:
+        old_group_id = getattr(
+            instance, '_counted_group_id', instance.group_id
+        )
+        if old_group_id != instance.group_id:
+            move_group_count(old_group_id, instance.group_id)
+            counters.change_post_counters(None, old_group_id, -1)
+            counters.change_post_counters(None, instance.group_id, 1)
+    instance._counted_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    group_id = getattr(instance, '_counted_group_id', instance.group_id)
+    adjust_counts(post_count_keys(instance.author_id, group_id), -1)
+    counters.change_post_counters(instance.author_id, group_id, -1)
+    timeline.post_removed(instance)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    group_id = getattr(instance, '_counted_group_id', instance.group_id)
+    bump_tags(*post_tags(instance, {group_id}))
+    user_cache.invalidate(instance.author.username)
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    if 'image' in instance.__dict__:
+        image = instance.__dict__['image']
+        instance._stored_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    old_name = getattr(instance, '_stored_image', None)
+    name = instance.image.name
+    if old_name and old_name != name:
+        transaction.on_commit(lambda: release_image(old_name))
+    instance._stored_image = name
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_init, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    if 'slug' in instance.__dict__:
+        instance._tagged_slug = instance.slug
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    """Название группы выводится и на главной."""
+    slugs = {instance.slug, getattr(instance, '_tagged_slug', instance.slug)}
+    bump_tags(INDEX_TAG, *map(group_tag, slugs))
+    instance._tagged_slug = instance.slug
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comment_counter(instance.post_id, 1)
+        post_cache.invalidate(instance.post_id)
+        bump_tags(*comment_tags(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comment_counter(instance.post_id, -1)
+    post_cache.invalidate(instance.post_id)
+    bump_tags(*comment_tags(instance))
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_follow_counters(
+            instance.user_id, instance.author_id, 1
+        )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    # Подключён после count_saved_follow: переход порога pull
+    # определяется по уже сдвинутому счётчику.
+    if created and instance.user_id and instance.author_id:
+        timeline.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_follow_counters(instance.user_id, instance.author_id, -1)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.follow_removed(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    """На профилях видны числа подписчиков и подписок."""
+    usernames = follow_usernames(instance)
+    bump_tags(*map(profile_tag, usernames))
+    user_cache.invalidate(*usernames)
+
+
+@receiver(request_started)
+def start_image_batch(sender, **kwargs):
+    thumbnails.start_batch()
+
+
+@receiver(request_finished)
+def process_image_batch(sender, **kwargs):
+    thumbnails.finish_batch()
@@ -0,0 +1,72 @@
+from .models import Follow, Group, Post, User
+
+INDEX_TAG = 'posts:index'
+
+
+def group_tag(slug):
+    return f'posts:group:{slug}'
+
+
+def profile_tag(username):
+    return f'posts:profile:{username}'
+
+
+def post_tag(post_id):
+    return f'posts:post:{post_id}'
+
+
+def index_tags(request):
+    return [INDEX_TAG]
+
+
+def group_tags(request, slug):
+    return [group_tag(slug)]
+
+
+def profile_tags(request, username):
+    return [profile_tag(username)]
+
+
+def post_detail_tags(request, post_id):
+    return [post_tag(post_id)]
+
+
+def post_tags(post, group_ids):
+    """Теги страниц, на которых виден пост из групп group_ids."""
+    group_ids = {group_id for group_id in group_ids if group_id}
+    if group_ids == {post.group_id} and Post.group.is_cached(post):
+        slugs = [post.group.slug]
+    else:
+        slugs = Group.objects.filter(
+            pk__in=group_ids
+        ).values_list('slug', flat=True)
+    return [
+        INDEX_TAG,
+        post_tag(post.pk),
+        profile_tag(post.author.username),
+        *map(group_tag, slugs),
+    ]
+
+
+def comment_tags(comment):
+    """Теги страниц, на которых видно число комментариев поста:
+    карточка поста выводится в лентах, а не только на его странице."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=comment.post_id
+    ).first()
+    if post is None:
+        return [post_tag(comment.post_id)]
+    return post_tags(post, {post.group_id})
+
+
+def follow_usernames(follow):
+    """Имена подписчика и автора, без запроса, если они уже загружены."""
+    if Follow.user.is_cached(follow) and Follow.author.is_cached(follow):
+        usernames = [
+            user.username for user in (follow.user, follow.author) if user
+        ]
+    else:
+        usernames = User.objects.filter(
+            pk__in=[follow.user_id, follow.author_id]
+        ).values_list('username', flat=True)
+    return list(usernames)
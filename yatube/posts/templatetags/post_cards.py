@@ -0,0 +1,75 @@
+import hashlib
+
+from core.page_cache import get_or_compute
+from django import template
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..images import picture
+from ..resize import resized_url as build_resized_url
+from ..thumbnails import CARD_THUMBNAIL, cached_thumbnail
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card_body.html'
+MISSING = object()
+
+
+def card_version(post):
+    """Версия карточки по всему, что в неё выводится.
+
+    Ключ меняется вместе с содержимым, поэтому карточки не нужно
+    сбрасывать: правка поста меняет modified и перерисовывает только
+    его карточку.
+    """
+    group = post.group
+    parts = (
+        post.modified.isoformat(), post.comments_count,
+        post.author.username, post.author.get_full_name(),
+        group and group.slug, group and group.title,
+    )
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+@register.simple_tag
+def post_card(post, show_author_link=False, show_group_link=False):
+    """Отрисованная карточка поста без частей, зависящих от зрителя.
+
+    Готовые варианты картинки выводятся через <picture> со srcset.
+    До их появления карточка показывает миниатюру: для ленты её заранее
+    находит prefetch_thumbnails, для отдельного поста она ищется здесь.
+    Пока нет и миниатюры, выводится исходное изображение, а карточка
+    кэшируется под отдельным ключом.
+    """
+    thumbnail = getattr(post, 'card_thumbnail', MISSING)
+    if post.image_variants:
+        thumbnail = None
+    elif thumbnail is MISSING:
+        geometry, options = CARD_THUMBNAIL
+        thumbnail = cached_thumbnail(post.image, geometry, **options)
+    context = {
+        'post': post,
+        'thumbnail': thumbnail,
+        'show_author_link': bool(show_author_link),
+        'show_group_link': bool(show_group_link),
+    }
+    key = (
+        f'post_card:{post.pk}:{card_version(post)}:'
+        f'{context["show_author_link"]:d}{context["show_group_link"]:d}'
+        f'{thumbnail is not None:d}'
+    )
+
+    def render():
+        context['picture'] = picture(post)
+        return render_to_string(CARD_TEMPLATE, context)
+
+    return mark_safe(
+        get_or_compute(key, render, settings.FRAGMENT_CACHE_TIMEOUT)
+    )
+
+
+@register.simple_tag
+def resized_url(name, width, crop='fit'):
+    """Подписанная ссылка на картинку нужной ширины."""
+    return build_resized_url(name, int(width), crop)
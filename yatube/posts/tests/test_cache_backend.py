@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+from core.cache import SQLiteCache
+from django.test import SimpleTestCase
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def make_cache(self, **options):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteCache(
+            os.path.join(directory.name, 'cache.sqlite3'),
+            {'OPTIONS': {'CULL_EVERY': 1, **options}},
+        )
+
+    def test_basic_operations(self):
+        """Запись, чтение, add и удаление работают как у LocMem"""
+        cache = self.make_cache()
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 'другое'))
+        self.assertEqual(cache.get_many(['key', 'missing']), {
+            'key': {'value': 1},
+        })
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'другое'))
+
+    def test_expired_entries_are_missing(self):
+        """Просроченная запись не читается и уступает место add"""
+        cache = self.make_cache()
+        cache.set('key', 'значение', 0)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'новое'))
+        self.assertEqual(cache.get('key'), 'новое')
+
+    def test_incr(self):
+        """incr увеличивает значение и падает на отсутствующем ключе"""
+        cache = self.make_cache()
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter', 5), 6)
+        self.assertEqual(cache.get('counter'), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи"""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        for key, age in (('b', 20), ('c', 10)):
+            cache.connection.execute(
+                'UPDATE cache SET accessed = accessed - ? WHERE key = ?',
+                (age, cache.make_key(key)),
+            )
+        cache.set('d', 'd')
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertEqual(cache.get('d'), 'd')
+        self.assertIsNone(cache.get('b'))
+
+    def test_size_limit(self):
+        """Суммарный размер записей не превышает MAX_BYTES"""
+        cache = self.make_cache(MAX_BYTES=5000)
+        for i in range(10):
+            cache.set(f'key{i}', b'x' * 1000)
+        size, = cache.connection.execute(
+            'SELECT SUM(size) FROM cache'
+        ).fetchone()
+        self.assertLessEqual(size, 5000)
+        self.assertIsNotNone(cache.get('key9'))
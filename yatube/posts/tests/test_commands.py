@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from core.models import StoredFile
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from ..models import Follow, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SEED_OPTIONS = {
+    'users': 50,
+    'groups': 5,
+    'posts': 400,
+    'comments': 100,
+    'follows': 200,
+    'skip_derived': True,
+    'stdout': StringIO(),
+}
+
+
+class SeedCommandTests(TestCase):
+    def seed(self, prefix, seed=1):
+        call_command('seed', prefix=prefix, seed=seed, **SEED_OPTIONS)
+        return list(
+            Post.objects.filter(author__username__startswith=prefix)
+            .order_by('pk').values_list('text', 'created')
+        )
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый --seed даёт одинаковые данные"""
+        first = self.seed('first')
+        second = self.seed('second')
+        self.assertEqual(len(first), SEED_OPTIONS['posts'])
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, self.seed('third', seed=2))
+
+    def test_seed_is_skewed(self):
+        """Авторы постов и подписок распределены неравномерно"""
+        self.seed('seed')
+        posts = list(
+            Post.objects.values('author').annotate(total=Count('pk'))
+            .order_by('-total').values_list('total', flat=True)
+        )
+        followers = list(
+            Follow.objects.values('author').annotate(total=Count('pk'))
+            .order_by('-total').values_list('total', flat=True)
+        )
+        self.assertGreater(posts[0], posts[len(posts) // 2] * 5)
+        self.assertGreater(followers[0], followers[len(followers) // 2] * 5)
+
+    def test_seed_images_are_referenced_by_posts(self):
+        """Картинки сида лежат в хранилище, и ссылок на файл столько же,
+        сколько постов его держат"""
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        call_command(
+            'seed', prefix='images', images=3, image_share=0.5,
+            **SEED_OPTIONS
+        )
+        uses = dict(
+            Post.objects.exclude(image='').order_by().values_list('image')
+            .annotate(total=Count('pk'))
+        )
+        self.assertTrue(uses)
+        self.assertEqual(
+            dict(StoredFile.objects.values_list('name', 'references')), uses
+        )
+        for name in uses:
+            self.assertTrue(Post.image.field.storage.exists(name))
+
+
+class BenchViewsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed', prefix='bench', **SEED_OPTIONS)
+
+    def bench(self, **options):
+        output = tempfile.NamedTemporaryFile(suffix='.json')
+        self.addCleanup(output.close)
+        call_command(
+            'bench_views', requests=2, warmup=0, output=output.name,
+            stdout=StringIO(), stderr=StringIO(), **options
+        )
+        with open(output.name) as results:
+            return output.name, json.load(results)
+
+    def test_results_cover_views(self):
+        """Бенчмарк проходит все страницы и не меняет базу"""
+        posts = Post.objects.count()
+        _, results = self.bench()
+        self.assertEqual(Post.objects.count(), posts)
+        created = results['post_create:reader:write']
+        self.assertEqual(created['statuses'], [302])
+        for name in ('index:anon', 'follow_index:reader', 'tech:anon'):
+            with self.subTest(name=name):
+                self.assertEqual(results[name]['statuses'], [200])
+                self.assertGreater(results[name]['bytes'], 0)
+        for mode in ('single', 'batched'):
+            with self.subTest(mode=mode):
+                self.assertEqual(
+                    results[f'thumbnails:index:{mode}']['queries'], 0
+                )
+
+    def test_shared_cache_is_untouched(self):
+        """Бенчмарк работает на своём кэше и не сбрасывает общий"""
+        cache.set('bench-marker', 'kept')
+        self.bench(only='index:anon', cold_cache=True)
+        self.assertEqual(cache.get('bench-marker'), 'kept')
+
+    def test_baseline_regression(self):
+        """Рост p95 относительно базы считается регрессией"""
+        path, results = self.bench(only='post_detail:anon')
+        results['post_detail:anon']['p95'] = 0
+        with open(path, 'w') as baseline:
+            json.dump(results, baseline)
+        with self.assertRaises(CommandError):
+            self.bench(only='post_detail:anon', baseline=path)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DedupMediaCommandTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def write_image(self, name, color):
+        content = BytesIO()
+        Image.new('RGB', (40, 20), color).save(content, 'PNG')
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as image:
+            image.write(content.getvalue())
+
+    def test_duplicates_are_merged(self):
+        """Одинаковые картинки сливаются, посты ссылаются на одну копию"""
+        user = User.objects.create_user(username='author')
+        self.write_image('posts/first.png', 'red')
+        self.write_image('posts/copy.png', 'red')
+        self.write_image('posts/other.png', 'blue')
+        for name in ('first', 'copy', 'other'):
+            Post.objects.create(
+                author=user, text=name, image=f'posts/{name}.png'
+            )
+        output = StringIO()
+        call_command('dedup_media', stdout=output)
+        self.assertIn('дубликатов: 1', output.getvalue())
+        images = dict(Post.objects.values_list('text', 'image'))
+        self.assertEqual(images['first'], images['copy'])
+        self.assertNotEqual(images['first'], images['other'])
+        references = dict(
+            StoredFile.objects.values_list('name', 'references')
+        )
+        self.assertEqual(
+            references, {images['first']: 2, images['other']: 1}
+        )
+        for name in ('first', 'copy', 'other'):
+            self.assertFalse(os.path.exists(
+                os.path.join(TEMP_MEDIA_ROOT, f'posts/{name}.png')
+            ))
+        self.assertTrue(
+            Post.objects.get(text='copy').variants.get('image/jpeg')
+        )
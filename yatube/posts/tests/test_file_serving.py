@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+
+from core.file_serving import parse_range
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = 'posts/ab/cd/' + 'abcd' * 16 + '.txt'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FileServingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('plain.txt', HASHED_NAME):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'0123456789')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_file_has_validators_and_cache_lifetime(self):
+        """Файл отдаётся с валидаторами; с хешем в имени — навсегда"""
+        response = self.get('plain.txt')
+        self.assertEqual(self.content(response), b'0123456789')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response = self.get(HASHED_NAME)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_conditional_request_is_not_modified(self):
+        """Совпавший ETag даёт 304 без тела"""
+        etag = self.get('plain.txt')['ETag']
+        response = self.get('plain.txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range_requests(self):
+        """Range отдаёт часть файла, чужой If-Range — весь файл"""
+        response = self.get('plain.txt', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.content(response), b'2345')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        response = self.get('plain.txt', HTTP_RANGE='bytes=-3')
+        self.assertEqual(self.content(response), b'789')
+        response = self.get('plain.txt', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get('plain.txt', HTTP_RANGE='bytes=5-3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), b'0123456789')
+        response = self.get(
+            'plain.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), b'0123456789')
+
+    def test_parse_range(self):
+        """Разбор Range: открытые границы, несколько диапазонов,
+        конец раньше начала"""
+        cases = (
+            ('bytes=0-', (0, 9)),
+            ('bytes=5-100', (5, 9)),
+            ('bytes=9-9', (9, 9)),
+            ('bytes=-20', (0, 9)),
+            ('bytes=0-1,3-4', None),
+            ('items=0-1', None),
+            ('bytes=5-3', None),
+            ('bytes=20-10', None),
+        )
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 10), expected)
+        for header in ('bytes=10-', 'bytes=10-20', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range(header, 10)
+
+    def test_proxy_modes(self):
+        """В режимах прокси тело не читается, а путь уходит в заголовок"""
+        with self.settings(
+            FILE_SERVING_MODE='x-accel-redirect',
+            FILE_SERVING_LOCATIONS={TEMP_MEDIA_ROOT: '/internal/media/'},
+        ):
+            response = self.get('plain.txt')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/internal/media/plain.txt'
+        )
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+        with self.settings(FILE_SERVING_MODE='x-sendfile'):
+            response = self.get('plain.txt')
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(TEMP_MEDIA_ROOT, 'plain.txt'),
+        )
+
+    def test_missing_and_outside_files_are_not_found(self):
+        """Нет файла или путь за пределами каталога — 404"""
+        for name in ('missing.txt', 'posts', '../settings.py'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
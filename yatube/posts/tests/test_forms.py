@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -62,6 +63,9 @@ class PostFormTests(TestCase):
             content=self.small_gif,
             content_type='image/gif'
         )
+        digest = hashlib.sha256(self.small_gif).hexdigest()
+        # Картинки хранятся под хешем содержимого.
+        self.image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
         self.form_data = {
             'text': 'Тестовый текст',
             'group': self.group.pk,
@@ -85,7 +89,7 @@ class PostFormTests(TestCase):
             Post.objects.filter(
                 text=self.form_data['text'],
                 group=self.form_data['group'],
-                image='posts/small.gif',
+                image=self.image_name,
                 author=self.post.author
             ).exists()
         )
@@ -108,7 +112,7 @@ class PostFormTests(TestCase):
             Post.objects.filter(
                 text=self.form_data['text'],
                 group=self.form_data['group'],
-                image='posts/small.gif',
+                image=self.image_name,
                 author=self.post.author
             ).exists()
         )
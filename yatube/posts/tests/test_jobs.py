@@ -0,0 +1,203 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from core.jobs import claim, enqueue, get_stats, run, work
+from core.models import Job
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Follow, Post, UserCounters
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+calls = []
+
+
+def record(*args):
+    calls.append(args)
+
+
+def fail():
+    raise ValueError('Сломалось')
+
+
+@override_settings(JOBS_RETRY_DELAY=10, JOBS_MAX_ATTEMPTS=2)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_queued_jobs(self):
+        """Воркер выполняет задачи и отмечает их выполненными"""
+        enqueue('posts.tests.test_jobs.record', 1, 'два')
+        enqueue('posts.tests.test_jobs.record', 3, delay=60)
+        self.assertEqual(work('test', burst=True), 1)
+        self.assertEqual(calls, [(1, 'два')])
+        self.assertEqual(
+            Job.objects.filter(status=Job.DONE).count(), 1
+        )
+        self.assertEqual(
+            Job.objects.filter(status=Job.PENDING).count(), 1
+        )
+
+    def test_pending_job_is_not_duplicated(self):
+        """Одинаковая задача ждёт в очереди один раз, а во время
+        выполнения её можно поставить снова"""
+        first = enqueue('posts.tests.test_jobs.record', 1, delay=60)
+        second = enqueue('posts.tests.test_jobs.record', 1)
+        self.assertEqual(first.pk, second.pk)
+        self.assertLessEqual(second.run_at, timezone.now())
+        self.assertNotEqual(
+            enqueue('posts.tests.test_jobs.record', 2).pk, first.pk
+        )
+        [running, _] = claim('test', 10)
+        again = enqueue('posts.tests.test_jobs.record', *json.loads(
+            running.payload
+        ))
+        self.assertNotEqual(again.pk, running.pk)
+
+    def test_retry_yields_to_requeued_twin(self):
+        """Упавшая задача не повторяется, если такая же уже в очереди"""
+        enqueue('posts.tests.test_jobs.fail')
+        [job] = claim('test', 1)
+        twin = enqueue('posts.tests.test_jobs.fail')
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertFalse(run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(
+            list(Job.objects.filter(status=Job.PENDING)), [twin]
+        )
+
+    def test_job_is_claimed_once(self):
+        """Задачу в аренде не забирает другой воркер, пока аренда идёт"""
+        job = enqueue('posts.tests.test_jobs.record')
+        self.assertEqual(len(claim('first', 10)), 1)
+        self.assertEqual(claim('second', 10), [])
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        [reclaimed] = claim('second', 10)
+        self.assertEqual(reclaimed.locked_by, 'second')
+        self.assertEqual(reclaimed.attempts, 2)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        """Упавшая задача откладывается, а после попыток помечается"""
+        job = enqueue('posts.tests.test_jobs.fail')
+        before = timezone.now()
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertFalse(run(claim('test', 1)[0]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertIn('Сломалось', job.error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=5))
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            run(claim('test', 1)[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stats_by_job_type(self):
+        """Статистика считает задачи и задержки по типам"""
+        enqueue('posts.tests.test_jobs.record', 1)
+        enqueue('posts.tests.test_jobs.record', 2)
+        enqueue('posts.tests.test_jobs.fail', delay=60)
+        work('test', burst=True)
+        stats = get_stats(timedelta(minutes=1))
+        self.assertEqual(stats['posts.tests.test_jobs.record']['done'], 2)
+        self.assertEqual(stats['posts.tests.test_jobs.fail']['queued'], 1)
+        output = StringIO()
+        call_command('runworker', burst=True, stdout=output)
+        self.assertIn('Задач выполнено: 0', output.getvalue())
+        self.assertIn('posts.tests.test_jobs.record', output.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, JOBS_WORKER=True)
+class ImageJobTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_uploaded_image_is_processed_by_worker(self):
+        """С JOBS_WORKER картинку обрабатывает воркер, а не запрос"""
+        user = User.objects.create_user(username='author')
+        self.client.force_login(user)
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        post = Post.objects.get()
+        self.assertEqual(post.variants, {})
+        job = Job.objects.get(name='posts.thumbnails.build_image')
+        self.assertEqual(job.payload, f'["{post.image.name}"]')
+        work('test', burst=True)
+        post.refresh_from_db()
+        self.assertIn('image/jpeg', post.variants)
+
+
+@override_settings(JOBS_WORKER=True)
+class TimelineJobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.author, text='Старый пост')
+
+    def test_fan_out_and_backfill_run_in_worker(self):
+        """С JOBS_WORKER ленты заполняет воркер, а не запрос"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(self.reader.timeline.exists())
+        work('test', burst=True)
+        self.assertEqual(
+            set(self.reader.timeline.values_list('post', flat=True)),
+            {self.post.pk, new_post.pk},
+        )
+
+    def test_unfollow_then_follow_keeps_timeline(self):
+        """Поздняя очистка ленты не стирает посты новой подписки"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        work('test', burst=True)
+        Follow.objects.get(user=self.reader, author=self.author).delete()
+        Follow.objects.create(user=self.reader, author=self.author)
+        copy = Job.objects.get(
+            name='posts.timeline.copy_follow', status=Job.PENDING
+        )
+        Job.objects.filter(pk=copy.pk).update(
+            run_at=timezone.now() - timedelta(minutes=1)
+        )
+        work('test', burst=True)
+        self.assertTrue(self.reader.timeline.filter(post=self.post).exists())
+
+    def test_recount_can_be_queued(self):
+        """recount --enqueue ставит пересчёт в очередь"""
+        UserCounters.objects.filter(user=self.author).update(posts_count=0)
+        call_command('recount', enqueue=True, stdout=StringIO())
+        self.assertEqual(
+            Job.objects.filter(name__startswith='posts.counters.').count(), 3
+        )
+        work('test', burst=True)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count, 1
+        )
@@ -0,0 +1,103 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Прогоняет миграции posts от migrate_from до migrate_to
+    на данных, созданных методом setUpBeforeMigration."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('posts', self.migrate_from)])
+        old_apps = executor.loader.project_state(
+            [('posts', self.migrate_from)]
+        ).apps
+        self.setUpBeforeMigration(old_apps)
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('posts', self.migrate_to)])
+        self.apps = executor.loader.project_state(
+            [('posts', self.migrate_to)]
+        ).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def setUpBeforeMigration(self, apps):
+        pass
+
+
+class FillTimelinesMigrationTests(MigrationTestCase):
+    migrate_from = '0013_auto_20221209_1242'
+    migrate_to = '0014_timelineentry'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        Follow = apps.get_model('posts', 'Follow')
+        self.reader = User.objects.create(username='reader')
+        author = User.objects.create(username='writer')
+        other = User.objects.create(username='other')
+        Follow.objects.create(user=self.reader, author=author)
+        self.posts = {
+            Post.objects.create(author=author, text=f'Пост {i}').pk
+            for i in range(3)
+        }
+        Post.objects.create(author=other, text='Чужой пост')
+
+    def test_existing_follows_fill_timelines(self):
+        """Миграция раскладывает старые посты по лентам подписчиков"""
+        TimelineEntry = self.apps.get_model('posts', 'TimelineEntry')
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user_id=self.reader.pk
+            ).values_list('post_id', flat=True)),
+            self.posts,
+        )
+        self.assertEqual(TimelineEntry.objects.count(), 3)
+
+
+class FillCountersMigrationTests(MigrationTestCase):
+    migrate_from = '0014_timelineentry'
+    migrate_to = '0015_counters'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Group = apps.get_model('posts', 'Group')
+        Post = apps.get_model('posts', 'Post')
+        Comment = apps.get_model('posts', 'Comment')
+        Follow = apps.get_model('posts', 'Follow')
+        self.reader = User.objects.create(username='reader')
+        self.author = User.objects.create(username='writer')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Post.objects.create(author=self.author, text='Пост без группы')
+        for i in range(2):
+            Comment.objects.create(
+                author=self.reader, post=self.post, text=f'Комментарий {i}'
+            )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_existing_rows_fill_counters(self):
+        """Миграция заполняет счётчики по уже существующим данным"""
+        Group = self.apps.get_model('posts', 'Group')
+        Post = self.apps.get_model('posts', 'Post')
+        UserCounters = self.apps.get_model('posts', 'UserCounters')
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 2)
+        self.assertEqual(
+            set(UserCounters.objects.values_list(
+                'user_id', 'posts_count', 'followers_count',
+                'following_count',
+            )),
+            {(self.author.pk, 2, 1, 0), (self.reader.pk, 0, 0, 1)},
+        )
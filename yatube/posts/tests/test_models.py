@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import SYMB_IN_TEXT, Group, Post
+from ..models import SYMB_IN_TEXT, Comment, Follow, Group, Post, UserCounters
 
 User = get_user_model()
 
@@ -34,3 +37,62 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         group_title = group.title
         self.assertEqual(group_title, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_saves_and_deletes(self):
+        """Счётчики постов, комментариев и подписок
+        обновляются при сохранении и удалении объектов"""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Пост'
+        )
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.user.counters.posts_count, 1)
+        self.assertEqual(self.user.counters.followers_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).following_count, 1
+        )
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).followers_count, 0
+        )
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики"""
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f'Пост {i}')
+            for i in range(3)
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.user)]
+        )
+        call_command('recount', batch_size=2, stdout=StringIO())
+        self.group.refresh_from_db()
+        counters = UserCounters.objects.get(user=self.user)
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(counters.posts_count, 3)
+        self.assertEqual(counters.followers_count, 1)
@@ -0,0 +1,92 @@
+from core.object_cache import LocalLRU
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from ..caches import group_cache, post_cache, user_cache
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ObjectCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        for object_cache in (post_cache, group_cache, user_cache):
+            object_cache.local.clear()
+
+    def test_cached_post_comes_with_relations(self):
+        """Повторное чтение поста с автором и группой не ходит в базу"""
+        post_cache.get(self.post.pk)
+        with self.assertNumQueries(0):
+            post = post_cache.get(self.post.pk)
+            self.assertEqual(post.author.username, self.user.username)
+            self.assertEqual(post.group.slug, self.group.slug)
+
+    def test_l2_is_used_after_l1_miss(self):
+        """После сброса L1 объект берётся из общего кэша"""
+        post_cache.get(self.post.pk)
+        post_cache.local.clear()
+        with self.assertNumQueries(0):
+            post_cache.get(self.post.pk)
+
+    def test_post_edit_invalidates(self):
+        """Правка и новый комментарий сбрасывают кэш поста"""
+        post_cache.get(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый пост'
+        post.save()
+        self.assertEqual(post_cache.get(self.post.pk).text, post.text)
+        Comment.objects.create(
+            author=self.reader, post=self.post, text='Комментарий'
+        )
+        self.assertEqual(post_cache.get(self.post.pk).comments_count, 1)
+
+    def test_slug_change_invalidates_old_key(self):
+        """Группа не находится по старому slug после его смены"""
+        group_cache.get(self.group.slug)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+        with self.assertRaises(Group.DoesNotExist):
+            group_cache.get('test-slug')
+        self.assertEqual(group_cache.get('new-slug').pk, self.group.pk)
+
+    def test_follow_invalidates_user_counters(self):
+        """Подписка обновляет счётчики закэшированного пользователя"""
+        user_cache.get(self.user.username)
+        Follow.objects.create(user=self.reader, author=self.user)
+        author = user_cache.get(self.user.username)
+        self.assertEqual(author.counters.followers_count, 1)
+
+
+class LocalLRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        """При переполнении вытесняется давно не читавшийся ключ"""
+        lru = LocalLRU(size=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+
+    def test_entries_expire(self):
+        """Запись не живёт дольше timeout"""
+        lru = LocalLRU(size=2, timeout=0)
+        lru.set('a', 1)
+        self.assertIsNone(lru.get('a'))
@@ -0,0 +1,327 @@
+from time import time
+
+from core.page_cache import (get_or_compute, get_stats, lock_key,
+                             reset_stats, stat_key)
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class TaggedPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Первый пост'
+        )
+        cls.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[cls.group.slug]),
+            'other_group': reverse(
+                'posts:group_list', args=[cls.other_group.slug]
+            ),
+            'profile': reverse('posts:profile', args=[cls.user.username]),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def warm(self):
+        return {
+            name: self.client.get(url).content
+            for name, url in self.urls.items()
+        }
+
+    def assertChanged(self, before, names):
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                content = self.client.get(url).content
+                if name in names:
+                    self.assertNotEqual(content, before[name])
+                else:
+                    self.assertEqual(content, before[name])
+
+    def test_pages_are_served_from_cache(self):
+        """Повторный запрос страницы не ходит в базу"""
+        self.warm()
+        for url in self.urls.values():
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.client.get(url)
+
+    def test_new_post_invalidates_pages(self):
+        """Новый пост сразу виден на главной, в группе и в профиле"""
+        before = self.warm()
+        Post.objects.create(
+            author=self.user, group=self.group, text='Новый пост'
+        )
+        self.assertChanged(before, {'index', 'group', 'profile'})
+
+    def test_group_change_invalidates_both_groups(self):
+        """Смена группы сбрасывает страницы старой и новой групп"""
+        before = self.warm()
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertChanged(before, {'index', 'group', 'other_group'})
+
+    def test_delete_invalidates_pages(self):
+        """Удалённый пост сразу пропадает со страниц"""
+        before = self.warm()
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertChanged(before, {'index', 'group', 'profile'})
+
+    def test_comment_invalidates_post_cards(self):
+        """Комментарий обновляет число комментариев в карточке поста
+        на главной, в группе и в профиле"""
+        before = self.warm()
+        Comment.objects.create(
+            author=self.reader, post=self.post, text='Комментарий'
+        )
+        self.assertChanged(before, {'index', 'group', 'profile'})
+
+    def test_follow_invalidates_profile(self):
+        """Подписка обновляет счётчики в профиле"""
+        before = self.warm()
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertChanged(before, {'profile'})
+
+    @override_settings(PUBLIC_PAGE_SHELLS=False)
+    def test_pages_are_cached_per_user(self):
+        """Авторизованный пользователь не получает чужую копию"""
+        anonymous = self.client.get(self.urls['index']).content
+        self.client.force_login(self.reader)
+        self.assertNotEqual(
+            self.client.get(self.urls['index']).content, anonymous
+        )
+
+
+class PublicPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.user.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_viewer(self, client, **params):
+        return client.get(reverse('posts:viewer'), params).json()
+
+    def test_pages_are_the_same_for_everyone(self):
+        """Публичные страницы одинаковы для всех и кэшируются публично"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertNotIn('Cookie', response.get('Vary', ''))
+                self.assertFalse(response.cookies)
+                self.assertEqual(
+                    self.reader_client.get(url).content, response.content
+                )
+
+    def test_viewer_for_anonymous(self):
+        """Аноним получает меню гостя без токена и подписки"""
+        viewer = self.get_viewer(self.client, author=self.user.username)
+        self.assertEqual(viewer['username'], '')
+        self.assertEqual(viewer['csrf_token'], '')
+        self.assertIsNone(viewer['following'])
+        self.assertIn('Войти', viewer['menu'])
+
+    def test_viewer_for_user(self):
+        """Вошедший получает меню, токен и актуальную подписку"""
+        viewer = self.get_viewer(self.reader_client, author='author')
+        self.assertEqual(viewer['username'], self.reader.username)
+        self.assertTrue(viewer['csrf_token'])
+        self.assertFalse(viewer['following'])
+        self.assertIn('Выйти', viewer['menu'])
+        Follow.objects.create(user=self.reader, author=self.user)
+        viewer = self.get_viewer(self.reader_client, author='author')
+        self.assertTrue(viewer['following'])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.urls = {
+            'index': reverse('posts:index'),
+            'profile': reverse('posts:profile', args=[cls.user.username]),
+            'post': reverse('posts:post_detail', args=[cls.post.pk]),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def revalidate(self, url, response, header='ETag'):
+        request_header = {
+            'ETag': 'HTTP_IF_NONE_MATCH',
+            'Last-Modified': 'HTTP_IF_MODIFIED_SINCE',
+        }[header]
+        return self.client.get(url, **{request_header: response[header]})
+
+    def test_not_modified_without_queries(self):
+        """Неизменившаяся страница отдаёт 304 без запросов к базе"""
+        for name, url in self.urls.items():
+            response = self.client.get(url)
+            for header in ('ETag', 'Last-Modified'):
+                with self.subTest(page=name, header=header):
+                    with self.assertNumQueries(0):
+                        self.assertEqual(
+                            self.revalidate(url, response, header)
+                            .status_code, 304
+                        )
+
+    def test_changes_update_validators(self):
+        """Новый пост и комментарий меняют валидаторы своих страниц"""
+        responses = {
+            name: self.client.get(url) for name, url in self.urls.items()
+        }
+        Post.objects.create(author=self.user, text='Новый пост')
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Комментарий'
+        )
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                self.assertEqual(
+                    self.revalidate(url, responses[name]).status_code, 200
+                )
+
+    def test_comment_updates_feed_validators(self):
+        """Комментарий меняет валидаторы лент, где карточка поста
+        показывает число комментариев"""
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        post = Post.objects.create(
+            author=self.user, group=group, text='Пост в группе'
+        )
+        urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[group.slug]),
+            'profile': reverse('posts:profile', args=[self.user.username]),
+        }
+        responses = {name: self.client.get(url) for name, url in urls.items()}
+        Comment.objects.create(author=self.user, post=post, text='Ответ')
+        for name, url in urls.items():
+            with self.subTest(page=name):
+                self.assertEqual(
+                    self.revalidate(url, responses[name]).status_code, 200
+                )
+
+    def test_edit_updates_modified(self):
+        """Правка поста сдвигает дату изменения"""
+        modified = self.post.modified
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый пост'
+        post.save()
+        self.assertGreater(post.modified, modified)
+
+
+@override_settings(PAGE_CACHE_LOCK_WAIT=0.1, PAGE_CACHE_EARLY_BETA=0)
+class GetOrComputeTests(SimpleTestCase):
+    key = 'test-page'
+
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def store_expired(self, value):
+        cache.set(self.key, (value, time() - 1, 0.01), 60)
+
+    def test_hit_and_miss(self):
+        """Пересчёт только при промахе, счётчики считают оба случая"""
+        first = get_or_compute(self.key, self.compute, 60)
+        second = get_or_compute(self.key, self.compute, 60)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        stats = get_stats()
+        self.assertEqual((stats['hit'], stats['miss']), (1, 1))
+
+    @override_settings(PAGE_CACHE_STATS_FLUSH_INTERVAL=60)
+    def test_stats_are_flushed_in_batches(self):
+        """Счётчики копятся в процессе и пишутся в кэш одним incr"""
+        get_or_compute(self.key, self.compute, 60)
+        for _ in range(3):
+            get_or_compute(self.key, self.compute, 60)
+        self.assertIsNone(cache.get(stat_key('hit')))
+        self.assertEqual(get_stats()['hit'], 3)
+        self.assertEqual(cache.get(stat_key('hit')), 3)
+
+    def test_stale_copy_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдаётся устаревшая копия"""
+        self.store_expired('старое')
+        cache.add(lock_key(self.key), 1)
+        self.assertEqual(get_or_compute(self.key, self.compute, 60), 'старое')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(get_stats()['stale'], 1)
+
+    def test_expired_copy_refreshed_by_lock_holder(self):
+        """Запрос, взявший блокировку, обновляет копию и снимает её"""
+        self.store_expired('старое')
+        self.assertEqual(
+            get_or_compute(self.key, self.compute, 60), 'значение 1'
+        )
+        self.assertIsNone(cache.get(lock_key(self.key)))
+        self.assertEqual(get_stats()['refresh'], 1)
+
+    def test_miss_waits_for_lock(self):
+        """При промахе без блокировки запрос ждёт, а потом считает сам"""
+        cache.add(lock_key(self.key), 1)
+        self.assertEqual(
+            get_or_compute(self.key, self.compute, 60), 'значение 1'
+        )
+        self.assertEqual(get_stats()['lock_wait'], 1)
+
+    @override_settings(PAGE_CACHE_EARLY_BETA=10 ** 6)
+    def test_early_refresh(self):
+        """Копию с долгим пересчётом обновляют до истечения срока"""
+        cache.set(self.key, ('старое', time() + 1, 1), 60)
+        self.assertEqual(
+            get_or_compute(self.key, self.compute, 60), 'значение 1'
+        )
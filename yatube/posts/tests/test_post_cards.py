@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.test.signals import template_rendered
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..templatetags.post_cards import CARD_TEMPLATE
+
+User = get_user_model()
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(3):
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.rendered = []
+        template_rendered.connect(self.on_render)
+        self.addCleanup(template_rendered.disconnect, self.on_render)
+
+    def on_render(self, sender, template, context, **kwargs):
+        if template.name == CARD_TEMPLATE:
+            self.rendered.append(context['post'].text)
+
+    def get_index(self):
+        self.rendered.clear()
+        return self.client.get(reverse('posts:index'))
+
+    def test_new_post_renders_only_its_card(self):
+        """После нового поста отрисовывается только его карточка"""
+        self.get_index()
+        self.assertEqual(len(self.rendered), 3)
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.get_index()
+        self.assertEqual(self.rendered, ['Новый пост'])
+        self.assertContains(response, 'Пост 0')
+
+    def test_edit_changes_card(self):
+        """Правка поста даёт новую карточку"""
+        self.get_index()
+        post = Post.objects.get(text='Пост 1')
+        post.text = 'Изменённый пост'
+        post.save()
+        response = self.get_index()
+        self.assertEqual(self.rendered, ['Изменённый пост'])
+        self.assertNotContains(response, 'Пост 1')
+
+    @override_settings(PUBLIC_PAGE_SHELLS=False)
+    def test_edit_link_is_not_cached(self):
+        """Ссылка на редактирование видна только автору"""
+        self.get_index()
+        author_client = Client()
+        author_client.force_login(self.user)
+        response = author_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Редактировать', count=3)
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertNotContains(response, 'Редактировать')
@@ -0,0 +1,132 @@
+from core.query_budget import QueryBudgetExceeded, query_budget
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserCounters
+from ..utils import POSTS_ON_ONE_PAGE
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def create_posts(self, count):
+        posts = [
+            Post.objects.create(
+                author=self.user, group=self.group, text=f'Пост {i}'
+            ) for i in range(count)
+        ]
+        for post in posts:
+            Comment.objects.create(
+                author=self.reader, post=post, text='Комментарий'
+            )
+        return posts[-1]
+
+    def visit_all_views(self):
+        post = Post.objects.first()
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+        )
+        for client in (self.guest_client, self.authorized_client):
+            for url in pages:
+                with self.subTest(url=url):
+                    client.get(url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Ещё комментарий'},
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост', 'group': self.group.pk},
+        )
+        author_client = Client()
+        author_client.force_login(self.user)
+        author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Изменённый пост', 'group': ''},
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': self.user})
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.user})
+        )
+
+    def test_views_fit_budget_with_one_post(self):
+        """Все страницы укладываются в бюджет запросов с одним постом"""
+        self.create_posts(1)
+        self.visit_all_views()
+
+    def test_views_fit_budget_with_full_page(self):
+        """Бюджет не растёт с числом постов на странице"""
+        self.create_posts(POSTS_ON_ONE_PAGE)
+        self.visit_all_views()
+
+    def test_follow_index_fits_budget_with_pull_authors(self):
+        """Посты «тяжёлых» авторов читаются одним запросом на всех"""
+        self.create_posts(POSTS_ON_ONE_PAGE)
+        for i in range(3):
+            author = User.objects.create_user(username=f'heavy{i}')
+            Follow.objects.create(user=self.reader, author=author)
+            UserCounters.objects.filter(user=author).update(
+                timeline_pull=True
+            )
+            for j in range(POSTS_ON_ONE_PAGE):
+                Post.objects.create(author=author, text=f'Пост {i}.{j}')
+        for page in (1, 2):
+            with self.subTest(page=page):
+                response = self.authorized_client.get(
+                    reverse('posts:follow_index') + f'?page={page}'
+                )
+                self.assertEqual(
+                    len(response.context['page_obj']), POSTS_ON_ONE_PAGE
+                )
+
+    def test_strict_mode_raises(self):
+        """В строгом режиме превышение бюджета вызывает исключение"""
+        @query_budget(queries=1)
+        def greedy_view(request):
+            list(User.objects.all())
+            list(Group.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            greedy_view(RequestFactory().get('/'))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_violation_is_logged(self):
+        """Без строгого режима превышение пишется в лог"""
+        @query_budget(queries=0)
+        def greedy_view(request):
+            list(User.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs('core.query_budget', level='WARNING'):
+            greedy_view(RequestFactory().get('/'))
@@ -0,0 +1,113 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..utils import POSTS_ON_ONE_PAGE
+
+User = get_user_model()
+
+SEED_USERS = 20
+SEED_POSTS = 300
+SEED_COMMENTS = 300
+
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    """Проверяет, что основные запросы страниц идут по индексам:
+    без полного прохода по таблице и без сортировки во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        users = [
+            User.objects.create_user(username=f'user{i}')
+            for i in range(SEED_USERS)
+        ]
+        cls.user, cls.author = users[0], users[1]
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for follower in users[1:]:
+            Follow.objects.create(user=follower, author=cls.user)
+            Follow.objects.create(user=cls.user, author=follower)
+        Post.objects.bulk_create(
+            Post(
+                author=users[i % SEED_USERS],
+                group=cls.group if i % 2 else None,
+                text=f'Пост {i}',
+                image=f'posts/{i}.jpg' if i % 3 else '',
+            ) for i in range(SEED_POSTS)
+        )
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.bulk_create(
+            Comment(
+                author=users[i % SEED_USERS],
+                post=cls.post,
+                text=f'Комментарий {i}',
+            ) for i in range(SEED_COMMENTS)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn(TEMP_SORT, step)
+                    self.assertIsNone(FULL_SCAN.search(step))
+
+    def test_feed_pages_use_indexes(self):
+        """Ленты и их глубокие страницы не сортируют и не сканируют таблицы"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={
+                'username': self.author.username
+            }),
+            reverse('posts:follow_index'),
+        )
+        deep_page = SEED_POSTS // POSTS_ON_ONE_PAGE // 4
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+            self.assert_plans_use_indexes(f'{url}?page={deep_page}')
+
+    def test_post_detail_uses_indexes(self):
+        """Страница поста выбирает комментарии по индексу"""
+        self.assert_plans_use_indexes(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+
+    def test_posts_by_image_use_index(self):
+        """Посты картинки ищутся по индексу имени, а не проходом таблицы"""
+        query = Post.objects.filter(image='posts/a.jpg').query
+        steps = self.explain(*query.sql_with_params())
+        self.assertTrue(any('post_image_idx' in step for step in steps))
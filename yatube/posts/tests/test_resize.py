@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from core.disk_cache import DiskLRUCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+from ..resize import resized_url, signature
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    RESIZE_CACHE_DIR=os.path.join(TEMP_MEDIA_ROOT, 'resized'),
+)
+class ResizedImageViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        content = BytesIO()
+        Image.new('RGB', (700, 400), 'green').save(content, 'JPEG')
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Пост с фотографией',
+            image=SimpleUploadedFile(
+                name='photo.jpg', content=content.getvalue(),
+                content_type='image/jpeg',
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_signed_url_returns_resized_image(self):
+        """Подписанная ссылка отдаёт копию нужной ширины с долгим кэшем"""
+        name = self.post.image.name
+        response = self.client.get(resized_url(name, 640, 'card'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept', response['Vary'])
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (640, 226))
+        response = self.client.get(resized_url(name, 1920))
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (700, 400))
+
+    def test_bad_signature_and_size_are_rejected(self):
+        """Чужая подпись и размер не из списка дают 404"""
+        name = self.post.image.name
+        with self.assertRaises(ValueError):
+            resized_url(name, 123)
+        urls = (
+            reverse('posts:resized_image', args=['bad', 640, 'fit', name]),
+            reverse('posts:resized_image', args=[
+                signature(name, 123, 'fit'), 123, 'fit', name,
+            ]),
+            resized_url('posts/missing.jpg', 640),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class DiskLRUCacheTests(SimpleTestCase):
+    def make_cache(self, max_bytes):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return DiskLRUCache(directory.name, max_bytes, cull_every=1)
+
+    def test_least_recently_read_files_are_evicted(self):
+        """При превышении лимита удаляются давно не читанные файлы"""
+        cache = self.make_cache(max_bytes=250)
+        for age, key in enumerate(('cc', 'bb', 'aa')):
+            path = cache.set(key * 16, b'x' * 100)
+            os.utime(path, (time.time() - 10 + age, time.time() - 10 + age))
+        self.assertIsNone(cache.get('cc' * 16))
+        self.assertIsNotNone(cache.get('bb' * 16))
+        self.assertIsNotNone(cache.get('aa' * 16))
+        self.assertLessEqual(cache.size(), 250)
+
+    def test_concurrent_misses_create_once(self):
+        """Параллельные промахи одного ключа создают файл один раз"""
+        cache = self.make_cache(max_bytes=10 ** 6)
+        calls = []
+
+        def create():
+            calls.append(1)
+            time.sleep(0.05)
+            return b'data'
+
+        threads = [
+            threading.Thread(target=cache.get_or_create, args=('ab', create))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        with open(cache.get('ab'), 'rb') as cached:
+            self.assertEqual(cached.read(), b'data')
+
+    def test_keys_with_common_prefix_do_not_share_lock(self):
+        """Ключи с общим началом не ждут друг друга"""
+        cache = self.make_cache(max_bytes=10 ** 6)
+        acquired = threading.Event()
+
+        def lock_other():
+            with cache.lock('abc-640w'):
+                acquired.set()
+
+        with cache.lock('abc-320w'):
+            thread = threading.Thread(target=lock_other)
+            thread.start()
+            self.assertTrue(acquired.wait(1))
+        thread.join()
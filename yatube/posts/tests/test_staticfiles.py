@@ -0,0 +1,72 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from core.staticfiles import CompressedManifestStaticFilesStorage
+from django.conf import settings
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SOURCE_DIR = os.path.join(TEMP_DIR, 'static')
+STATIC_ROOT = os.path.join(TEMP_DIR, 'staticfiles')
+CSS = b'body { margin: 0; }\n' * 100
+
+
+@override_settings(STATICFILES_DIRS=[SOURCE_DIR], STATIC_ROOT=STATIC_ROOT)
+class StaticManifestTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(SOURCE_DIR, 'css'))
+        os.makedirs(os.path.join(SOURCE_DIR, 'img'))
+        with open(os.path.join(SOURCE_DIR, 'css', 'app.css'), 'wb') as file:
+            file.write(CSS)
+        with open(os.path.join(SOURCE_DIR, 'img', 'logo.png'), 'wb') as file:
+            file.write(os.urandom(256))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return CompressedManifestStaticFilesStorage()
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        """collectstatic пишет имена с хешем и сжатые копии текста"""
+        storage = self.collect()
+        css = storage.stored_name('css/app.css')
+        logo = storage.stored_name('img/logo.png')
+        self.assertRegex(css, r'^css/app\.[0-9a-f]{12}\.css$')
+        with storage.open(css + '.gz') as file:
+            self.assertEqual(gzip.decompress(file.read()), CSS)
+        self.assertFalse(storage.exists(logo + '.gz'))
+
+    def test_static_tag_uses_manifest(self):
+        """{% static %} берёт имя из манифеста, а без записи — исходное"""
+        storage = self.collect()
+        self.assertEqual(
+            static('css/app.css'),
+            settings.STATIC_URL + storage.stored_name('css/app.css'),
+        )
+        self.assertEqual(
+            static('css/missing.css'), settings.STATIC_URL + 'css/missing.css'
+        )
+
+    def test_compressed_copy_is_served(self):
+        """Сжатая копия отдаётся тем, кто её принимает, с вечным кэшем"""
+        url = settings.STATIC_URL + self.collect().stored_name('css/app.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        content = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(content), CSS)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), CSS)
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+
+from core.models import StoredFile
+from core.storage import ContentAddressedStorage
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковое содержимое хранится одним файлом с двумя ссылками"""
+        first = self.storage.save('posts/a.JPG', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'another'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.startswith('posts/'))
+        self.assertTrue(first.endswith('.jpg'))
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(self.storage.path(first)))), 1
+        )
+        self.assertEqual(StoredFile.objects.get(name=first).references, 2)
+
+    def test_file_is_deleted_with_last_reference(self):
+        """Файл удаляется, только когда на него не осталось ссылок"""
+        name = self.storage.save('posts/a.jpg', ContentFile(b'picture'))
+        self.storage.save('posts/b.jpg', ContentFile(b'picture'))
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(self.storage.release(name))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
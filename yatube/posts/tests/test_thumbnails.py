@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from core.models import Job
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from ..images import supported_formats
+from ..models import Post
+from ..resize import resized_url
+from ..thumbnails import (CARD_THUMBNAIL, cached_thumbnail, finish_batch,
+                          process_image, start_batch, submit)
+from ..utils import show_paginator
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, PUBLIC_PAGE_SHELLS=False)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif',
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def thumbnail_files(self):
+        return self.files('cache')
+
+    def files(self, directory):
+        directory = os.path.join(TEMP_MEDIA_ROOT, directory)
+        return [
+            name for _, _, names in os.walk(directory) for name in names
+        ]
+
+    def test_feed_does_not_generate_thumbnails(self):
+        """Лента не создаёт миниатюры и ссылается на копию по запросу."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, resized_url(self.post.image.name, 960, 'card')
+        )
+        self.assertEqual(self.thumbnail_files(), [])
+
+    @override_settings(JOBS_WORKER=True)
+    def test_reads_do_not_enqueue_images(self):
+        """Чтение ленты и страницы поста не ставит обработку в очередь."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertFalse(Job.objects.exists())
+
+    def test_backfill_builds_thumbnails(self):
+        """Команда backfill_images готовит и миниатюры."""
+        self.addCleanup(
+            shutil.rmtree, os.path.join(TEMP_MEDIA_ROOT, 'cache'), True
+        )
+        call_command('backfill_images', stdout=StringIO())
+        self.assertEqual(len(self.thumbnail_files()), 1)
+
+    def generate_thumbnail(self):
+        geometry, options = CARD_THUMBNAIL
+        get_thumbnail(self.post.image.name, geometry, **options)
+
+    def test_generated_thumbnail_is_shown(self):
+        """Готовая миниатюра берётся из кэша и попадает в карточку."""
+        self.generate_thumbnail()
+        geometry, options = CARD_THUMBNAIL
+        with self.assertNumQueries(0):
+            thumbnail = cached_thumbnail(
+                self.post.image, geometry, **options
+            )
+        self.assertEqual(len(self.thumbnail_files()), 1)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_page_prefetches_thumbnails(self):
+        """Страница ленты сразу получает миниатюры всех постов."""
+        Post.objects.create(author=self.user, text='Пост без картинки')
+        self.generate_thumbnail()
+        geometry, options = CARD_THUMBNAIL
+        expected = cached_thumbnail(self.post.image, geometry, **options)
+        request = RequestFactory().get(reverse('posts:index'))
+        page_obj = show_paginator(request, Post.objects.all(), keyset=True)
+        thumbnails = {
+            post.text: post.card_thumbnail and post.card_thumbnail.url
+            for post in page_obj
+        }
+        self.assertEqual(thumbnails, {
+            'Пост с картинкой': expected.url,
+            'Пост без картинки': None,
+        })
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, PUBLIC_PAGE_SHELLS=False)
+class ImageVariantsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        image = Image.new('RGB', (700, 400), 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        content = BytesIO()
+        image.save(content, 'JPEG', exif=exif)
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с фотографией',
+            image=SimpleUploadedFile(
+                name='photo.jpg', content=content.getvalue(),
+                content_type='image/jpeg',
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_variants_are_recorded(self):
+        """Варианты нужных ширин сохраняются в пост без метаданных."""
+        process_image(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (700, 400))
+        self.assertEqual(
+            set(post.variants),
+            {mime for mime, *_ in supported_formats()} | {'placeholder'},
+        )
+        jpeg = post.variants['image/jpeg']
+        self.assertEqual(
+            [(width, height) for _, width, height in jpeg],
+            [(320, 113), (640, 226)],
+        )
+        with Image.open(os.path.join(TEMP_MEDIA_ROOT, jpeg[0][0])) as image:
+            self.assertEqual(image.size, (320, 113))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_card_has_srcset(self):
+        """Карточка выводит srcset, sizes и размеры картинки."""
+        process_image(self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        variants = Post.objects.get(pk=self.post.pk).variants
+        name = variants['image/jpeg'][0][0]
+        self.assertContains(response, f'/media/{name} 320w')
+        self.assertContains(response, 'sizes="(max-width: 960px)')
+        self.assertContains(response, 'width="640" height="226"')
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_images_are_processed_after_response(self):
+        """Картинки запроса обрабатываются только после ответа."""
+        start_batch()
+        submit(self.post.image.name)
+        submit(self.post.image.name)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).variants, {})
+        finish_batch()
+        self.assertIn(
+            'image/jpeg', Post.objects.get(pk=self.post.pk).variants
+        )
+
+    def test_placeholder_is_recorded(self):
+        """Заглушка и основной цвет вычисляются вместе с вариантами."""
+        process_image(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        placeholder = post.variants['placeholder']
+        self.assertTrue(placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(placeholder), 2000)
+        self.assertEqual(post.image_color, '#fe0000')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, placeholder)
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill_fills_missing_placeholders(self):
+        """Команда дозаполняет заглушки у старых постов."""
+        output = StringIO()
+        call_command('backfill_images', stdout=output)
+        self.assertIn('обработано: 1', output.getvalue())
+        self.assertIn(
+            'placeholder', Post.objects.get(pk=self.post.pk).variants
+        )
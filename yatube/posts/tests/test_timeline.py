@@ -0,0 +1,204 @@
+from io import StringIO
+
+from core.jobs import work
+from core.models import Job
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..counts import count_key
+from ..models import Follow, Post, TimelineEntry, UserCounters
+from ..utils import POSTS_ON_ONE_PAGE
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту ранее написанные посты автора"""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={
+                'username': self.author.username
+            })
+        )
+        self.assertTrue(
+            self.user.timeline.filter(post=self.old_post).exists()
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора"""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={
+                'username': self.author.username
+            })
+        )
+        self.assertFalse(self.user.timeline.exists())
+
+    def test_timeline_count_is_cached_and_adjusted(self):
+        """Размер ленты берётся из кэша и сдвигается при раскладке
+        постов, подписке, отписке и удалении поста"""
+        key = count_key('timeline', self.user.pk)
+        other = User.objects.create_user(username='other')
+        for i in range(2):
+            Post.objects.create(author=other, text=f'Другой {i}')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertEqual(cache.get(key), 1)
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(cache.get(key), 2)
+        Follow.objects.create(user=self.user, author=other)
+        self.assertEqual(cache.get(key), 4)
+        post.delete()
+        self.assertEqual(cache.get(key), 3)
+        Follow.objects.get(user=self.user, author=other).delete()
+        self.assertEqual(cache.get(key), 1)
+        self.assertEqual(cache.get(key), self.user.timeline.count())
+
+    def test_rebuild_timelines_command(self):
+        """Команда пересобирает ленты по подпискам"""
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(self.user.timeline.values_list('post', flat=True)),
+            list(self.author.posts.values_list('pk', flat=True)),
+        )
+
+    @override_settings(TIMELINE_PULL_THRESHOLD=2)
+    def test_pull_author_is_merged_on_read(self):
+        """Посты «тяжёлого» автора не раскладываются по лентам,
+        а подмешиваются при чтении в том же порядке, что и при join"""
+        light_author = User.objects.create_user(username='light')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.user, author=light_author)
+        work('test', burst=True)
+        for i in range(POSTS_ON_ONE_PAGE):
+            Post.objects.create(author=self.author, text=f'Тяжёлый {i}')
+            Post.objects.create(author=light_author, text=f'Лёгкий {i}')
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                author=self.author, post__text__startswith='Тяжёлый'
+            ).exists()
+        )
+        expected = list(
+            Post.objects.filter(author__following__user=self.user)
+            .order_by('-created', '-pk')
+        )
+        for page in (1, 2, 3):
+            with self.subTest(page=page):
+                response = self.authorized_client.get(
+                    reverse('posts:follow_index') + f'?page={page}'
+                )
+                start = (page - 1) * POSTS_ON_ONE_PAGE
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    expected[start:start + POSTS_ON_ONE_PAGE],
+                )
+
+    @override_settings(TIMELINE_PULL_THRESHOLD=2)
+    def test_crossing_threshold_up_moves_author_to_pull(self):
+        """Когда автор становится «тяжёлым», воркер убирает его записи
+        из лент, а посты по-прежнему видны подписчикам"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        self.assertTrue(self.user.timeline.exists())
+        work('test', burst=True)
+        self.assertTrue(self.author.counters.timeline_pull)
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.author
+        ).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.old_post])
+
+    @override_settings(TIMELINE_PULL_THRESHOLD=2, TIMELINE_PUSH_THRESHOLD=2)
+    def test_crossing_threshold_down_moves_author_to_push(self):
+        """Когда автор теряет подписчиков ниже нижнего порога, воркер
+        снова раскладывает его посты по лентам оставшихся подписчиков"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        work('test', burst=True)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        Follow.objects.get(user=fan, author=self.author).delete()
+        work('test', burst=True)
+        self.assertFalse(
+            UserCounters.objects.get(user=self.author).timeline_pull
+        )
+        self.assertEqual(
+            set(self.user.timeline.values_list('post', flat=True)),
+            {self.old_post.pk, new_post.pk},
+        )
+        self.assertFalse(fan.timeline.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post]
+        )
+
+    @override_settings(TIMELINE_PULL_THRESHOLD=3, TIMELINE_PUSH_THRESHOLD=2)
+    def test_author_between_thresholds_keeps_mode(self):
+        """Между порогами отписка не возвращает автора в ленты"""
+        fans = [
+            User.objects.create_user(username=f'fan{i}') for i in range(2)
+        ]
+        for user in [self.user] + fans:
+            Follow.objects.create(user=user, author=self.author)
+        work('test', burst=True)
+        Follow.objects.get(user=fans[0], author=self.author).delete()
+        self.assertFalse(Job.objects.filter(
+            name='posts.timeline.move_to_push', status=Job.PENDING
+        ).exists())
+        work('test', burst=True)
+        self.assertTrue(
+            UserCounters.objects.get(user=self.author).timeline_pull
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.author
+        ).exists())
+
+    @override_settings(
+        TIMELINE_PULL_THRESHOLD=2,
+        TIMELINE_PUSH_THRESHOLD=2,
+        TIMELINE_PUSH_RECENT_POSTS=1,
+    )
+    def test_move_to_push_copies_only_recent_posts(self):
+        """При возврате в ленты раскладываются только последние посты"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        work('test', burst=True)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        Follow.objects.get(user=fan, author=self.author).delete()
+        work('test', burst=True)
+        self.assertEqual(
+            list(self.user.timeline.values_list('post', flat=True)),
+            [new_post.pk],
+        )
@@ -0,0 +1,139 @@
+import base64
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..counts import cached_count, compute_count, count_key
+from ..models import Group, Post
+from ..utils import POSTS_ON_ONE_PAGE, CursorPaginator, show_paginator
+
+User = get_user_model()
+
+TOTAL_POSTS = POSTS_ON_ONE_PAGE * 2 + 3
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}')
+            for i in range(TOTAL_POSTS)
+        )
+        cls.expected = list(Post.objects.order_by('-created', '-pk'))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def get_page(self, cursor=None):
+        data = {'cursor': cursor} if cursor else {}
+        request = self.factory.get('/', data)
+        return show_paginator(request, Post.objects.all(), keyset=True)
+
+    def test_cursor_pages_walk_all_posts(self):
+        """Курсоры «вперёд» проходят все посты без пропусков и повторов"""
+        page = self.get_page()
+        self.assertIsInstance(page.paginator, CursorPaginator)
+        self.assertFalse(page.has_previous())
+        walked = list(page)
+        while page.has_next():
+            page = self.get_page(page.next_cursor)
+            walked.extend(page)
+        self.assertEqual(walked, self.expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор «назад» возвращает предыдущую страницу"""
+        first = self.get_page()
+        second = self.get_page(first.next_cursor)
+        back = self.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор ведёт на первую страницу"""
+        created = self.expected[0].created.isoformat()
+        tokens = ['не-курсор'] + [
+            base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+            for raw in (
+                f'["{created}", 1e400, 0]',
+                f'["{created}", {10 ** 23}, 0]',
+                f'["{created}", 0, 0]',
+                f'["{created}", "1", 0]',
+                f'["{created}", 1.5, 0]',
+                '[1e400, 1, 0]',
+            )
+        ]
+        for token in tokens:
+            with self.subTest(token=token):
+                page = self.get_page(token)
+                self.assertEqual(
+                    list(page), self.expected[:POSTS_ON_ONE_PAGE]
+                )
+
+    def test_page_number_still_works(self):
+        """Ссылки вида ?page=N обслуживаются обычным пагинатором"""
+        request = self.factory.get('/', {'page': 3})
+        page = show_paginator(request, Post.objects.all(), keyset=True)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), TOTAL_POSTS - POSTS_ON_ONE_PAGE * 2)
+
+
+class CachedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(TOTAL_POSTS)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.key = count_key('group', self.group.pk)
+        self.other_key = count_key('group', self.other_group.pk)
+        cached_count(self.key, self.group.posts.all())
+        cached_count(self.other_key, self.other_group.posts.all())
+
+    def test_count_follows_create_and_delete(self):
+        """Счётчик в кэше сдвигается при создании и удалении поста"""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Новый'
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                cached_count(self.key, self.group.posts.all()),
+                TOTAL_POSTS + 1,
+            )
+        post.delete()
+        self.assertEqual(cache.get(self.key), TOTAL_POSTS)
+
+    def test_count_follows_group_change(self):
+        """Смена группы поста переносит его между счётчиками групп"""
+        post = self.group.posts.first()
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(cache.get(self.key), TOTAL_POSTS - 1)
+        self.assertEqual(cache.get(self.other_key), 1)
+
+    @override_settings(POSTS_COUNT_APPROXIMATE=True, POSTS_COUNT_EXACT_LIMIT=5)
+    def test_approximate_count(self):
+        """В приближённом режиме малые выборки считаются точно,
+        а для большой таблицы берётся оценка"""
+        self.assertEqual(compute_count(self.other_group.posts.all()), 0)
+        self.assertGreaterEqual(
+            compute_count(Post.objects.all()), TOTAL_POSTS
+        )
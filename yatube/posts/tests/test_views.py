@@ -292,10 +292,10 @@ class ViewsPagesTests(TestCase):
         )
         reverse_addr = reverse('posts:index')
         content1 = self.client.get(reverse_addr).content
-        post.delete()
-        content2 = self.client.get(reverse_addr).content
+        with self.assertNumQueries(0):
+            content2 = self.client.get(reverse_addr).content
         self.assertEqual(content1, content2)
-        cache.clear()
+        post.delete()
         content3 = self.client.get(reverse_addr).content
         self.assertNotEqual(content1, content3)
 
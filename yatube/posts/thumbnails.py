@@ -0,0 +1,159 @@
+import logging
+import threading
+
+from core.jobs import enqueue
+from django.conf import settings
+from django.db import transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from .images import record_variants
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые выводят шаблоны: для каждого загруженного
+# изображения они готовятся заранее.
+CARD_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+THUMBNAIL_SIZES = (CARD_THUMBNAIL,)
+
+_local = threading.local()
+
+
+def thumbnail_options(source, options):
+    """Опции миниатюры так же, как их дополняет ThumbnailBackend.
+
+    От опций зависит имя файла миниатюры, поэтому быстрый путь должен
+    получать то же имя, что и get_thumbnail.
+    """
+    options = dict(options)
+    backend = default.backend
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_key(name, geometry, options):
+    """Ключ миниатюры в кэше хранилища ключей sorl.
+
+    Исходник берётся по имени из хранилища sorl, как и в process_image,
+    иначе ключи разойдутся при другом хранилище у поля.
+    """
+    source = ImageFile(name)
+    options = thumbnail_options(source, options)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, options
+    )
+    return add_prefix(ImageFile(name, default.storage).key, 'image')
+
+
+def read_thumbnail(value):
+    """Миниатюра из значения кэша или None.
+
+    Чтение ничего не ставит в очередь: миниатюры готовятся при
+    создании и правке поста и командой backfill_images, а до тех пор
+    карточка выводит исходную картинку.
+    """
+    # cached_db кладёт в кэш заглушку на промах, у неё нет атрибутов
+    # миниатюры.
+    if not isinstance(value, str):
+        return None
+    return deserialize_image_file(value)
+
+
+def cached_thumbnail(file_, geometry, **options):
+    """Готовая миниатюра из кэша или None.
+
+    Ни файл, ни база не читаются: смотрим только в кэш хранилища
+    ключей sorl.
+    """
+    if not file_:
+        return None
+    key = thumbnail_key(file_.name, geometry, options)
+    return read_thumbnail(default.kvstore.cache.get(key))
+
+
+def prefetch_thumbnails(posts):
+    """Одним чтением кэша находит миниатюры карточек для всех постов.
+
+    Результат лежит в post.card_thumbnail, карточка берёт его оттуда
+    вместо отдельного чтения на каждый пост. Посты с готовыми
+    вариантами картинки миниатюра не нужна.
+    """
+    geometry, options = CARD_THUMBNAIL
+    keys = {
+        post.image.name: thumbnail_key(post.image.name, geometry, options)
+        for post in posts if post.image and not post.image_variants
+    }
+    values = default.kvstore.cache.get_many(set(keys.values()))
+    for post in posts:
+        thumbnail = None
+        if post.image and not post.image_variants:
+            thumbnail = read_thumbnail(values.get(keys[post.image.name]))
+        post.card_thumbnail = thumbnail
+
+
+def build_image(name):
+    """Создаёт миниатюры THUMBNAIL_SIZES и варианты картинки из хранилища."""
+    for geometry, options in THUMBNAIL_SIZES:
+        get_thumbnail(name, geometry, **options)
+    record_variants(name)
+
+
+def process_image(name):
+    """build_image, ошибки которого только пишутся в лог."""
+    try:
+        build_image(name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', name)
+
+
+def start_batch():
+    """Начинает копить картинки запроса до отправки ответа."""
+    _local.pending = []
+
+
+def finish_batch():
+    """Обрабатывает накопленные за запрос картинки.
+
+    Вызывается по request_finished, когда ответ уже отдан клиенту:
+    загрузка не ждёт обработки, но веб-процесс занят ею до конца и не
+    берёт следующий запрос. Вынести работу из веб-процессов можно
+    через JOBS_WORKER.
+    """
+    pending = getattr(_local, 'pending', None) or []
+    _local.pending = None
+    for name in dict.fromkeys(pending):
+        process_image(name)
+
+
+def submit(name):
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        # Вне запроса, например в команде, ждать нечего.
+        process_image(name)
+    else:
+        pending.append(name)
+
+
+def enqueue_image(name):
+    """Ставит обработку картинки в очередь после коммита транзакции.
+
+    Вызывается только при записи поста. Без JOBS_WORKER картинку
+    обрабатывает тот же веб-процесс после ответа (см. finish_batch),
+    с JOBS_WORKER — воркер runworker, и упавшая обработка повторяется.
+    """
+    if not name:
+        return
+    if settings.JOBS_WORKER:
+        enqueue('posts.thumbnails.build_image', name)
+    else:
+        transaction.on_commit(lambda: submit(name))
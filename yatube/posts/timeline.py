@@ -0,0 +1,245 @@
+import heapq
+from itertools import islice
+
+from core.jobs import dispatch, enqueue
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .counts import (adjust_counts, cached_author_counts, cached_count,
+                     count_key)
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+# Сколько ключей размеров лент читается из кэша за раз.
+COUNT_KEYS_BATCH = 500
+
+
+def _copy_into_timelines(where, params):
+    """Одним INSERT ... SELECT раскладывает посты авторов по лентам
+    подписчиков; уже разложенные записи пропускаются."""
+    ops = connection.ops
+    entries, posts, follows = (
+        ops.quote_name(model._meta.db_table)
+        for model in (TimelineEntry, Post, Follow)
+    )
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} {entries} '
+        '(user_id, post_id, author_id, created) '
+        'SELECT f.user_id, p.id, p.author_id, p.created '
+        f'FROM {follows} f INNER JOIN {posts} p ON p.author_id = f.author_id '
+        f'WHERE f.user_id IS NOT NULL AND {where} '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def timeline_count_key(user_id):
+    return count_key('timeline', user_id)
+
+
+def follower_count_keys(author_id):
+    """Ключи закэшированных размеров лент подписчиков автора."""
+    return [
+        timeline_count_key(user_id)
+        for user_id in Follow.objects.filter(
+            author_id=author_id, user__isnull=False
+        ).values_list('user_id', flat=True).iterator()
+    ]
+
+
+def adjust_follower_counts(author_id, delta):
+    keys = follower_count_keys(author_id)
+    for start in range(0, len(keys), COUNT_KEYS_BATCH):
+        adjust_counts(keys[start:start + COUNT_KEYS_BATCH], delta)
+
+
+def timeline_state(author_id):
+    """Число подписчиков автора и флаг pull-режима из UserCounters."""
+    return UserCounters.objects.filter(user_id=author_id).values_list(
+        'followers_count', 'timeline_pull'
+    ).first() or (0, False)
+
+
+def is_pull_author(author_id):
+    """Автор, чьи посты подмешиваются в ленту при чтении."""
+    return timeline_state(author_id)[1]
+
+
+def pull_authors(user):
+    """Возвращает id «тяжёлых» авторов из подписок пользователя.
+
+    Режим автора берётся из UserCounters по первичному ключу, а не
+    считается по таблице подписок при каждом чтении ленты.
+    """
+    return list(
+        Follow.objects.filter(
+            user=user, author__counters__timeline_pull=True,
+        ).values_list('author_id', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_pull_author(post.author_id):
+        dispatch('posts.timeline.copy_post', post.pk)
+
+
+def post_removed(post):
+    """Уменьшает размеры лент, из которых удалённый пост ушёл каскадом."""
+    if not is_pull_author(post.author_id):
+        adjust_follower_counts(post.author_id, -1)
+
+
+def follow_added(follow):
+    """Добавляет в ленту подписчика все посты нового автора.
+
+    Вызывается после сдвига счётчика подписчиков. Если автор набрал
+    TIMELINE_PULL_THRESHOLD подписчиков, его перевод в pull-режим
+    ставится в очередь: удаление записей из всех лент не делается
+    в запросе.
+    """
+    followers, pull = timeline_state(follow.author_id)
+    if not pull:
+        dispatch('posts.timeline.copy_follow', follow.pk)
+        if followers >= settings.TIMELINE_PULL_THRESHOLD:
+            enqueue('posts.timeline.move_to_pull', follow.author_id)
+
+
+def follow_removed(follow):
+    """Убирает из ленты подписчика посты автора, от которого он отписался.
+
+    Если у «тяжёлого» автора осталось меньше TIMELINE_PUSH_THRESHOLD
+    подписчиков, его возврат в ленты ставится в очередь.
+    """
+    dispatch('posts.timeline.drop_follow', follow.user_id, follow.author_id)
+    followers, pull = timeline_state(follow.author_id)
+    if pull and followers < settings.TIMELINE_PUSH_THRESHOLD:
+        enqueue('posts.timeline.move_to_push', follow.author_id)
+
+
+# Задачи ниже с JOBS_WORKER выполняет воркер, возможно позже и в другом
+# порядке, поэтому они смотрят на подписки и счётчики в момент запуска.
+# Копирование идёт через join с подписками и постами: удалённые к тому
+# времени строки в ленты не попадут.
+
+def copy_post(post_id):
+    if _copy_into_timelines('p.id = %s', [post_id]):
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).first()
+        adjust_follower_counts(author_id, 1)
+
+
+def copy_follow(follow_id):
+    copied = _copy_into_timelines('f.id = %s', [follow_id])
+    if copied:
+        user_id = Follow.objects.filter(pk=follow_id).values_list(
+            'user_id', flat=True
+        ).first()
+        adjust_counts([timeline_count_key(user_id)], copied)
+
+
+def move_to_pull(author_id):
+    """Переводит автора в pull-режим и убирает его записи из лент.
+
+    Флаг и удаление идут в одной транзакции задачи, поэтому лента
+    всегда берёт посты автора либо из записей, либо при чтении.
+    """
+    if timeline_state(author_id)[0] < settings.TIMELINE_PULL_THRESHOLD:
+        return
+    if UserCounters.objects.filter(
+        user_id=author_id, timeline_pull=False
+    ).update(timeline_pull=True):
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+        cache.delete_many(follower_count_keys(author_id))
+
+
+def move_to_push(author_id):
+    """Возвращает автора в ленты подписчиков.
+
+    Раскладываются только последние TIMELINE_PUSH_RECENT_POSTS постов
+    автора: более старые из ленты подписок пропадают.
+    """
+    if timeline_state(author_id)[0] >= settings.TIMELINE_PUSH_THRESHOLD:
+        return
+    if not UserCounters.objects.filter(
+        user_id=author_id, timeline_pull=True
+    ).update(timeline_pull=False):
+        return
+    posts = connection.ops.quote_name(Post._meta.db_table)
+    _copy_into_timelines(
+        f'p.id IN (SELECT id FROM {posts} WHERE author_id = %s '
+        'ORDER BY created DESC, id DESC LIMIT %s)',
+        [author_id, settings.TIMELINE_PUSH_RECENT_POSTS],
+    )
+    cache.delete_many(follower_count_keys(author_id))
+
+
+def drop_follow(user_id, author_id):
+    """Убирает посты автора из ленты, если подписка не вернулась."""
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exclude(author__following__user_id=user_id).delete()
+    if deleted:
+        adjust_counts([timeline_count_key(user_id)], -deleted)
+
+
+def rebuild_timelines():
+    """Пересобирает все ленты по текущим подпискам и постам."""
+    TimelineEntry.objects.all().delete()
+    counters = connection.ops.quote_name(UserCounters._meta.db_table)
+    _copy_into_timelines(
+        f'f.author_id NOT IN (SELECT user_id FROM {counters} '
+        'WHERE timeline_pull = %s)',
+        [True],
+    )
+    users = Follow.objects.filter(user__isnull=False).order_by().values_list(
+        'user_id', flat=True
+    ).distinct()
+    cache.delete_many(
+        timeline_count_key(user_id) for user_id in users.iterator()
+    )
+    return TimelineEntry.objects.count()
+
+
+class HomeFeed:
+    """Лента подписок: push-часть из TimelineEntry и pull-часть
+    из постов «тяжёлых» авторов, слитые по дате создания.
+
+    Поддерживает count() и срезы, поэтому страницы режет обычный Paginator.
+    """
+
+    def __init__(self, user):
+        self.user_id = user.pk
+        self.pull = pull_authors(user)
+        self.entries = user.timeline.exclude(
+            author_id__in=self.pull
+        ).select_related('post__author', 'post__group')
+        self.pulled = Post.objects.filter(
+            author_id__in=self.pull
+        ).select_related('author', 'group').order_by('-created', '-pk')
+
+    def count(self):
+        """Размер push-части берётся из кэша счётчиков: его сдвигают
+        раскладка и удаление записей ленты."""
+        entries = cached_count(timeline_count_key(self.user_id), self.entries)
+        return entries + sum(cached_author_counts(self.pull).values())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        streams = [(entry.post for entry in self.entries[:stop].iterator())]
+        if self.pull:
+            streams.append(self.pulled[:stop].iterator())
+        merged = heapq.merge(
+            *streams,
+            key=lambda post: (post.created, post.pk),
+            reverse=True,
+        )
+        return list(islice(merged, start, stop))
@@ -24,5 +24,11 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('viewer/', views.viewer, name='viewer'),
+    path(
+        'images/<str:signature>/<int:width>/<slug:crop>/<path:name>',
+        views.resized_image,
+        name='resized_image'
+    ),
     path('', views.index, name='index'),
 ]
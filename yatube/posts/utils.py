@@ -1,10 +1,135 @@
-from django.core.paginator import Paginator
+import base64
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .counts import cached_count
+from .thumbnails import prefetch_thumbnails
 
 POSTS_ON_ONE_PAGE = 10
+MAX_CURSOR_PK = 2 ** 63 - 1
+
 
+def show_paginator(request, post_list, keyset=False, count_key=None):
+    """Возвращает страницу постов.
 
-def show_paginator(request, post_list,):
-    paginator = Paginator(post_list, POSTS_ON_ONE_PAGE)
+    С keyset=True страницы режутся по курсору (created, id) из ?cursor=,
+    а старые ссылки вида ?page=N продолжают работать как раньше.
+    Если передан count_key, общее число постов берётся из кэша счётчиков.
+    Миниатюры карточек страницы находятся одним чтением кэша.
+    """
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if keyset and page_number is None:
+        paginator = CursorPaginator(
+            post_list, POSTS_ON_ONE_PAGE, count_key=count_key
+        )
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = CachedCountPaginator(
+            post_list, POSTS_ON_ONE_PAGE, count_key=count_key
+        )
+        page_obj = paginator.get_page(page_number)
+    prefetch_thumbnails(page_obj)
     return page_obj
+
+
+def encode_cursor(post, backwards=False):
+    data = [post.created.isoformat(), post.pk, int(backwards)]
+    token = base64.urlsafe_b64encode(json.dumps(data).encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (created, id, backwards) или None для битого курсора.
+
+    id должен быть целым числом в пределах BIGINT: иначе база
+    не сможет сравнить его с первичным ключом.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created, pk, backwards = json.loads(base64.urlsafe_b64decode(padded))
+        created = parse_datetime(created)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if created is None or type(pk) is not int:
+        return None
+    if not 1 <= pk <= MAX_CURSOR_PK:
+        return None
+    return created, pk, bool(backwards)
+
+
+class CachedCountPaginator(Paginator):
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        return cached_count(self.count_key, self.object_list)
+
+
+class CursorPaginator(CachedCountPaginator):
+    """Пагинатор по ключу (created, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: это один проход по индексу
+    от позиции курсора.
+    """
+    is_keyset = True
+
+    def get_page(self, cursor):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._page(self.object_list, backwards=False)
+        created, pk, backwards = position
+        if backwards:
+            posts = self.object_list.filter(
+                Q(created__gt=created) | Q(created=created, pk__gt=pk)
+            )
+        else:
+            posts = self.object_list.filter(
+                Q(created__lt=created) | Q(created=created, pk__lt=pk)
+            )
+        return self._page(posts, backwards, from_cursor=True)
+
+    def _page(self, posts, backwards, from_cursor=False):
+        ordering = ('created', 'pk') if backwards else ('-created', '-pk')
+        rows = list(posts.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            return CursorPage(rows, self, has_more, from_cursor)
+        return CursorPage(rows, self, from_cursor, has_more)
+
+
+class CursorPage(Page):
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        super().__init__(object_list, None, paginator)
+        self._has_previous = has_previous and bool(object_list)
+        self._has_next = has_next and bool(object_list)
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(self.object_list[0], backwards=True)
+        return None
@@ -1,16 +1,40 @@
+import os
+
+from core.file_serving import serve_file
+from core.page_cache import (get_generations, get_or_compute,
+                             is_public_shell, public_page, tag_validators,
+                             tagged_cache_page)
+from core.query_budget import query_budget
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
 
+from . import resize
+from .caches import group_cache, post_cache, user_cache
+from .counts import count_key
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .images import clear_derived_fields
+from .models import Follow, Post
+from .tags import (group_tags, index_tags, post_detail_tags, profile_tag,
+                   profile_tags)
+from .thumbnails import enqueue_image
+from .timeline import HomeFeed
 from .utils import show_paginator
 
 
-@cache_page(20, cache='default', key_prefix='index_page')
+@public_page
+@tag_validators(index_tags)
+@tagged_cache_page(index_tags, key_prefix='index_page')
+@query_budget(queries=4)
 def index(request):
     post_list = Post.objects.select_related('group', 'author')
-    page_obj = show_paginator(request, post_list)
+    page_obj = show_paginator(
+        request, post_list, keyset=True, count_key=count_key()
+    )
     context = {
         'page_obj': page_obj,
         'show_follow_link': True,
@@ -18,10 +42,16 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@public_page
+@tag_validators(group_tags)
+@tagged_cache_page(group_tags, key_prefix='group_page')
+@query_budget(queries=5)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = show_paginator(request, post_list)
+    group = group_cache.get_or_404(slug)
+    post_list = group.posts.select_related('author')
+    page_obj = show_paginator(
+        request, post_list, keyset=True, count_key=count_key('group', group.pk)
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -29,11 +59,21 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@public_page
+@tag_validators(profile_tags)
+@tagged_cache_page(profile_tags, key_prefix='profile_page')
+@query_budget(queries=6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = show_paginator(request, posts)
-    following = request.user.is_authenticated and author.following.exists()
+    author = user_cache.get_or_404(username)
+    posts = author.posts.select_related('group')
+    page_obj = show_paginator(
+        request, posts, keyset=True, count_key=count_key('author', author.pk)
+    )
+    following = (
+        not is_public_shell(request)
+        and request.user.is_authenticated
+        and author.following.exists()
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
@@ -42,10 +82,13 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@public_page
+@tag_validators(post_detail_tags)
+@query_budget(queries=5)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = post_cache.get_or_404(post_id)
     form = CommentForm()
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'form': form,
@@ -55,6 +98,7 @@ def post_detail(request, post_id):
 
 
 @login_required
+@query_budget(queries=8)
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -64,6 +108,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        enqueue_image(post.image.name)
         return redirect("posts:profile", post.author.username)
     form = PostForm()
     context = {
@@ -74,6 +119,7 @@ def post_create(request):
 
 
 @login_required
+@query_budget(queries=5)
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = PostForm(
@@ -84,7 +130,14 @@ def post_edit(request, post_id):
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            # Варианты старой картинки больше не подходят.
+            clear_derived_fields(post)
+        post.save()
+        if image_changed:
+            enqueue_image(post.image.name)
         return redirect('posts:post_detail', post_id)
     context = {
         'post': post,
@@ -95,8 +148,9 @@ def post_edit(request, post_id):
 
 
 @login_required
+@query_budget(queries=4)
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = post_cache.get_or_404(post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -107,10 +161,10 @@ def add_comment(request, post_id):
 
 
 @login_required
+@query_budget(queries=5)
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = show_paginator(request, posts)
+    page_obj = show_paginator(request, HomeFeed(request.user))
     context = {
         'page_obj': page_obj,
     }
@@ -118,9 +172,10 @@ def follow_index(request):
 
 
 @login_required
+@query_budget(queries=12)
 def profile_follow(request, username):
     user = request.user
-    author = get_object_or_404(User, username=username)
+    author = user_cache.get_or_404(username)
     if request.user != author:
         Follow.objects.get_or_create(
             user=user,
@@ -130,9 +185,66 @@ def profile_follow(request, username):
 
 
 @login_required
+@query_budget(queries=8)
 def profile_unfollow(request, username):
     Follow.objects.filter(
         user=request.user,
-        author=get_object_or_404(User, username=username)
+        author=user_cache.get_or_404(username)
     ).delete()
     return redirect('posts:profile', username)
+
+
+@query_budget(queries=4)
+def viewer(request):
+    """Части публичных страниц, зависящие от пользователя."""
+    user = request.user
+    menu = get_or_compute(
+        f'viewer_menu:{user.pk or "anon"}:{user.username}',
+        lambda: render_to_string('includes/viewer_menu.html', {
+            'viewer': user,
+        }),
+    )
+    data = {
+        'username': user.username,
+        'menu': menu,
+        'csrf_token': '',
+        'following': None,
+    }
+    author = request.GET.get('author')
+    if user.is_authenticated:
+        data['csrf_token'] = get_token(request)
+    if user.is_authenticated and author:
+        generation, = get_generations([profile_tag(author)])
+        data['following'] = get_or_compute(
+            f'viewer_following:{user.pk}:{generation}:{author}',
+            Follow.objects.filter(
+                user=user, author__username=author
+            ).exists,
+        )
+    response = JsonResponse(data)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_safe
+@query_budget(queries=0)
+def resized_image(request, signature, width, crop, name):
+    """Картинка поста нужной ширины по подписанной ссылке.
+
+    Копии кэшируются на диске, формат выбирается по Accept.
+    """
+    if not resize.is_valid(signature, name, width, crop):
+        raise Http404('Неверная подпись или размер')
+    try:
+        path, mime = resize.resized_file(
+            name, width, crop, request.META.get('HTTP_ACCEPT', '')
+        )
+    except OSError:
+        raise Http404('Картинка не найдена')
+    # Ключ дискового кэша уже зависит от имени, размера и формата.
+    response = serve_file(
+        request, path, content_type=mime,
+        etag=f'"{os.path.basename(path)}"', immutable=True,
+    )
+    patch_vary_headers(response, ('Accept',))
+    return response
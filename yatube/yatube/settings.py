@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -124,6 +128,10 @@ USE_TZ = True
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# collectstatic добавляет к именам хеш содержимого и пишет рядом сжатые
+# копии .gz и .br, поэтому статика кэшируется браузером на год.
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -136,12 +144,123 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш в файле SQLite общий для всех процессов, поэтому сброс поколений
+# страниц и счётчики видны каждому воркеру.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
 
+# Тесты (manage.py test и pytest) работают на своём кэше во временном
+# каталоге. Иначе они читали бы общий кэш, в котором могут лежать
+# страницы запущенного рядом сервера, и сбрасывали бы его.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, TEST_CACHE_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        TEST_CACHE_DIR, 'cache.sqlite3'
+    )
+
+# Авторы, у которых подписчиков не меньше порога, не раскладываются
+# по лентам при публикации, а подмешиваются в ленту при чтении.
+# Обратно в ленты автор возвращается, только когда подписчиков стало
+# меньше TIMELINE_PUSH_THRESHOLD: между порогами режим не меняется,
+# и подписки с отписками у границы не гоняют ленты туда и обратно.
+# При возврате по лентам раскладываются только последние
+# TIMELINE_PUSH_RECENT_POSTS постов автора. Переходы между режимами
+# всегда выполняет воркер manage.py runworker, даже без JOBS_WORKER:
+# до его запуска автор остаётся в прежнем режиме.
+TIMELINE_PULL_THRESHOLD = 10000
+TIMELINE_PUSH_THRESHOLD = 8000
+TIMELINE_PUSH_RECENT_POSTS = 100
+
+# Общее число постов для пагинатора берётся из кэша и сдвигается
+# при создании и удалении постов. В приближённом режиме точно
+# считаются только выборки не больше POSTS_COUNT_EXACT_LIMIT.
+POSTS_COUNT_TIMEOUT = 60 * 60
+POSTS_COUNT_APPROXIMATE = False
+POSTS_COUNT_EXACT_LIMIT = 1000
+
+# Страницы ленты кэшируются надолго: создание, правка и удаление постов
+# и подписки сбрасывают поколения тегов затронутых страниц.
+PAGE_CACHE_TIMEOUT = 5 * 60
+# После срока копия ещё PAGE_CACHE_STALE_TIMEOUT секунд отдаётся, пока
+# один запрос под блокировкой собирает новую. Остальные ждут готовую
+# копию не дольше PAGE_CACHE_LOCK_WAIT секунд. Чем больше
+# PAGE_CACHE_EARLY_BETA, тем раньше копия обновляется до истечения.
+PAGE_CACHE_STALE_TIMEOUT = 60
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_LOCK_WAIT = 2
+PAGE_CACHE_EARLY_BETA = 1.0
+# Счётчики попаданий и промахов копятся в памяти процесса и пишутся
+# в кэш раз в PAGE_CACHE_STATS_FLUSH_INTERVAL секунд.
+PAGE_CACHE_STATS_FLUSH_INTERVAL = 10
+
+# Посты, группы и пользователи кэшируются в процессе (L1) и в общем
+# кэше (L2). Сброс по сигналам доходит до L1 других процессов не сразу,
+# а через OBJECT_CACHE_L1_TIMEOUT секунд.
+OBJECT_CACHE_TIMEOUT = 10 * 60
+OBJECT_CACHE_L1_SIZE = 1000
+OBJECT_CACHE_L1_TIMEOUT = 5
+
+# Ключ карточки поста зависит от её содержимого, поэтому срок большой.
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Главная, группы, профили и посты отдаются одинаковыми для всех
+# с публичным Cache-Control, а части для вошедшего подставляет
+# posts:viewer.
+PUBLIC_PAGE_SHELLS = True
+PUBLIC_PAGE_MAX_AGE = 60
+
+# Картинки постов отдаются по подписанным ссылкам любой ширины из
+# RESIZE_WIDTHS. Готовые копии лежат в дисковом кэше, который
+# ограничен RESIZE_CACHE_MAX_BYTES и вытесняет давно не читанные.
+RESIZE_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+RESIZE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'resized')
+RESIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Медиа, собранная статика и копии картинок отдаются через
+# core.file_serving. Без FILE_SERVING_MODE байты передаёт
+# wsgi.file_wrapper сервера (sendfile у gunicorn). С 'x-accel-redirect'
+# или 'x-sendfile' Django только проверяет запрос, а файл отдаёт
+# front-прокси: для nginx каждому каталогу из FILE_SERVING_LOCATIONS
+# нужен internal location с alias на этот каталог.
+FILE_SERVING_MODE = None
+FILE_SERVING_LOCATIONS = {
+    MEDIA_ROOT: '/internal/media/',
+    STATIC_ROOT: '/internal/static/',
+    RESIZE_CACHE_DIR: '/internal/resized/',
+}
+# Файлы без хеша в имени могут поменяться, поэтому кэшируются недолго.
+FILE_SERVING_MAX_AGE = 60 * 60
+
+# Фоновые задачи лежат в таблице core_job и выполняются командой
+# manage.py runworker. С JOBS_WORKER воркеры обрабатывают картинки и
+# раскладывают посты по лентам подписчиков. Без него картинки
+# обрабатывают сами веб-процессы после отправки ответа, которые на это
+# время не принимают запросы, а ленты заполняются в самом запросе.
+# Аренда задачи JOBS_LEASE должна быть дольше самой долгой задачи,
+# в том числе manage.py recount --enqueue. Упавшая задача
+# повторяется через JOBS_RETRY_DELAY секунд, и пауза удваивается до
+# JOBS_RETRY_MAX_DELAY. Выполненные задачи хранятся JOBS_KEEP_DONE
+# секунд для статистики job_stats.
+JOBS_WORKER = False
+JOBS_LEASE = 10 * 60
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_RETRY_MAX_DELAY = 60 * 60
+JOBS_KEEP_DONE = 24 * 60 * 60
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Превышение бюджета запросов view вызывает исключение, а не запись в лог.
+QUERY_BUDGET_STRICT = False
@@ -1,5 +1,5 @@
+from core.file_serving import file_urls
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
@@ -10,6 +10,10 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts')),
 ]
+urlpatterns += file_urls(settings.MEDIA_URL, 'MEDIA_ROOT')
+urlpatterns += file_urls(
+    settings.STATIC_URL, 'STATIC_ROOT', precompressed=True
+)
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -18,7 +22,4 @@ handler500 = 'core.views.internal_server_error'
 if settings.DEBUG:
     import debug_toolbar
 
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)